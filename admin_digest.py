@@ -0,0 +1,105 @@
+import asyncio
+import logging
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+
+logger = logging.getLogger(__name__)
+
+MEDIA_GROUP_LIMIT = 10 # Telegram bir albomda ən çox 10 şəkil qəbul edir
+DONE_BUTTONS_PER_ROW = 4
+
+
+class AdminDigest:
+    """Adminə gedən yeni sifariş və çek bildirişlərini toplayıb bir mesajda göndərir.
+
+    flush() JobQueue ilə dövri çağırılır; bufer max_items-ə çatdıqda isə dərhal göndərilir.
+    receipt_keyboard(receipt_id) çekin təsdiq/rədd düymələrini qaytarır; on_receipt_message(admin_message_id, user_id)
+    adminə göndərilmiş hər çek mesajı üçün çağırılır ki, admin ona reply edəndə cavab istifadəçiyə getsin.
+    """
+
+    def __init__(self, admin_chat_id, max_items, receipt_keyboard=None, on_receipt_message=None):
+        self.admin_chat_id = admin_chat_id
+        self.max_items = max_items
+        self.receipt_keyboard = receipt_keyboard
+        self.on_receipt_message = on_receipt_message
+        self.orders = [] # [(order_id, user_id, service_type, amount, link)]
+        self.receipts = [] # [(receipt_id, user_id, file_id)]
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.orders) + len(self.receipts)
+
+    async def add_order(self, bot, order_id, user_id, service_type, amount, link):
+        self.orders.append((order_id, user_id, service_type, amount, link))
+        if len(self.orders) >= self.max_items:
+            await self.flush(bot)
+
+    async def add_receipt(self, bot, receipt_id, user_id, file_id):
+        self.receipts.append((receipt_id, user_id, file_id))
+        if len(self.receipts) >= MEDIA_GROUP_LIMIT:
+            await self.flush(bot)
+
+    async def flush(self, bot):
+        async with self._lock:
+            orders, self.orders = self.orders, []
+            receipts, self.receipts = self.receipts, []
+            if orders:
+                await self._send_orders(bot, orders)
+            for i in range(0, len(receipts), MEDIA_GROUP_LIMIT):
+                await self._send_receipts(bot, receipts[i:i + MEDIA_GROUP_LIMIT])
+
+    async def _send_orders(self, bot, orders):
+        lines = [f"**Yeni Sifarişlər ({len(orders)}):**\n"]
+        for order_id, user_id, service_type, amount, link in orders:
+            lines.append(f"`{order_id}` | User: `{user_id}` | `{service_type}` x `{amount}`\nLink: `{link[:100]}`")
+        lines.append("\nTamamlanan sifarişin düyməsinə klikləyin və ya `/done <id>` yazın.")
+
+        buttons = [InlineKeyboardButton(f"✅ {order[0]}", callback_data=f"order_done_{order[0]}") for order in orders]
+        keyboard = [buttons[i:i + DONE_BUTTONS_PER_ROW] for i in range(0, len(buttons), DONE_BUTTONS_PER_ROW)]
+        try:
+            await bot.send_message(
+                chat_id=self.admin_chat_id,
+                text="\n".join(lines),
+                parse_mode="Markdown",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+        except Exception as e:
+            logger.error(f"Could not send order digest ({len(orders)} orders): {e}")
+
+    async def _send_receipts(self, bot, receipts):
+        media = [
+            InputMediaPhoto(
+                file_id,
+                caption=f"Ödəniş çeki #{receipt_id}. İstifadəçi ID: `{user_id}`\n"
+                        f"Təsdiq üçün `/receipts` və ya `/approve {receipt_id} <məbləğ>`",
+                parse_mode="Markdown"
+            )
+            for receipt_id, user_id, file_id in receipts
+        ]
+        sent = [] # [(adminə göndərilmiş mesaj, user_id)]
+        try:
+            if len(media) == 1: # Albomda ən az 2 şəkil olmalıdır
+                receipt_id, user_id, _ = receipts[0]
+                message = await bot.send_photo(
+                    chat_id=self.admin_chat_id, photo=media[0].media, caption=media[0].caption, parse_mode="Markdown",
+                    reply_markup=self.receipt_keyboard(receipt_id) if self.receipt_keyboard else None,
+                )
+                sent.append((message, user_id))
+            else:
+                messages = await bot.send_media_group(chat_id=self.admin_chat_id, media=media)
+                sent.extend(zip(messages, (user_id for _, user_id, _ in receipts)))
+                # Albom mesajlarına düymə qoşmaq olmur — hər çekin düymələri ayrıca mesajdadır
+                if self.receipt_keyboard:
+                    for receipt_id, user_id, _ in receipts:
+                        message = await bot.send_message(
+                            chat_id=self.admin_chat_id,
+                            text=f"Çek #{receipt_id} (istifadəçi `{user_id}`): məbləği seçin və ya rədd edin.",
+                            parse_mode="Markdown",
+                            reply_markup=self.receipt_keyboard(receipt_id),
+                        )
+                        sent.append((message, user_id))
+        except Exception as e:
+            logger.error(f"Could not send receipt digest ({len(receipts)} receipts): {e}")
+        if self.on_receipt_message:
+            for message, user_id in sent:
+                self.on_receipt_message(message.message_id, user_id)
@@ -0,0 +1,75 @@
+"""Soyuq başlanğıc benchmark-ı: prosesin açılışından ilk cavab mesajına qədər keçən vaxt.
+
+Bot (python main.py) webhook rejimində işə salınır, Bot API yerinə bench_workers-dakı stub server işləyir.
+Port açılan kimi bir /start update-i göndərilir və stub ilk sendMessage-i aldıqda vaxt qeyd olunur.
+Verilənlər bazası ilk işə salınmadan sonra saxlanılır, yəni ölçülən "yuxudan oyanan" dynodur (sxem aktualdır).
+
+İstifadə (repo kökündən):
+    python -m benchmarks.bench_cold_start --runs 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import tornado.httpclient
+import tornado.web
+
+from benchmarks.bench_workers import ADMIN_ID, BOT_TOKEN, ROOT, SECRET, StubBotAPI, make_update
+
+
+async def run_once(workdir, api_port, bot_port, profile):
+    state = {"sent": 0, "expected": 1, "message_id": 0, "done": asyncio.Event()}
+    api = tornado.web.Application([(r"/bot[^/]+/(\w+)", StubBotAPI, {"state": state})])
+    api_server = api.listen(api_port, address="127.0.0.1")
+
+    env = dict(os.environ, BOT_TOKEN=BOT_TOKEN, ADMIN_ID=str(ADMIN_ID), PORT=str(bot_port),
+               WEBHOOK_URL="https://bench.invalid", WEBHOOK_SECRET_TOKEN=SECRET, WEBHOOK_LISTEN="127.0.0.1",
+               TELEGRAM_BASE_URL=f"http://127.0.0.1:{api_port}/bot", STARTUP_PROFILE="1" if profile else "0",
+               PYTHONPATH=ROOT)
+    env.pop("METRICS_PORT", None)
+    env.pop("WORKERS", None)
+    client = tornado.httpclient.AsyncHTTPClient()
+    started = time.perf_counter()
+    bot = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], env=env, cwd=workdir,
+                           stdout=subprocess.DEVNULL, stderr=None if profile else subprocess.DEVNULL)
+    try:
+        # Telegram kimi: port açılan kimi update göndəririk, açılmayıbsa təkrar cəhd edirik
+        while True:
+            try:
+                await client.fetch(f"http://127.0.0.1:{bot_port}/telegram", method="POST", body=make_update(1, 1, "/start"),
+                                   headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                break
+            except (ConnectionError, OSError):
+                await asyncio.sleep(0.005)
+        await asyncio.wait_for(state["done"].wait(), timeout=60)
+        return time.perf_counter() - started
+    finally:
+        bot.terminate()
+        bot.wait()
+        api_server.stop()
+
+
+async def main_async(args):
+    workdir = tempfile.mkdtemp(prefix="bot-cold-start-")
+    await run_once(workdir, args.api_port, args.port, False) # bazanı yaradır və miqrasiyaları tətbiq edir
+    timings = [await run_once(workdir, args.api_port, args.port, args.profile) for _ in range(args.runs)]
+    print(f"time to first response over {args.runs} runs: median {statistics.median(timings) * 1000:.0f} ms, "
+          f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--profile", action="store_true", help="botun STARTUP_PROFILE cədvəlini stderr-ə çıxar")
+    parser.add_argument("--port", type=int, default=18090)
+    parser.add_argument("--api-port", type=int, default=18091)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Avtomatik icra (fulfillment.py) üçün uçdan-uca benchmark lokal stub SMM panel ilə.
+
+Müvəqqəti bazada N istifadəçi N sifariş verir, FulfillmentWorker isə onları stub panelə göndərir və
+statuslarını yoxlayır. Panel sorğuların bir hissəsinə 500 qaytarır (təkrar cəhd), bir hissəsini rədd edir,
+bəzi sifarişləri ləğv edir (hər ikisi failed + məbləğin qaytarılması) və bəzilərini qismən icra edir
+(completed + icra olunmayan hissənin qaytarılması). Sonda hər sifarişin son statusu,
+qaytarılmaların düzgünlüyü, ledger-in balanslarla uyğunluğu və panelə açılmış TCP bağlantılarının sayı yoxlanılır.
+
+İstifadə (repo kökündən):
+    python -m benchmarks.bench_fulfillment --orders 2000 --latency 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import tornado.web
+
+os.environ.setdefault("BOT_TOKEN", "123456:STUB-TOKEN")
+os.environ.setdefault("ADMIN_ID", "1000")
+
+import database # noqa: E402
+import fulfillment # noqa: E402
+
+PRICE = 1.5
+AMOUNT = 1000
+PARTIAL_REMAINS = 200 # qismən icrada yerinə yetirilməyən miqdar
+
+
+class StubSmmPanel(tornado.web.RequestHandler):
+    """SMM panel API v2-nin (action=add|status) sadə təqlidi."""
+
+    def initialize(self, panel):
+        self.panel = panel
+
+    async def post(self):
+        panel = self.panel
+        panel["connections"].add(id(self.request.connection.stream))
+        panel["in_flight"] += 1
+        panel["max_in_flight"] = max(panel["max_in_flight"], panel["in_flight"])
+        try:
+            await asyncio.sleep(panel["latency"])
+            rng = panel["rng"]
+            action = self.get_body_argument("action")
+            if action == "add":
+                if rng.random() < panel["error_rate"]:
+                    self.set_status(500)
+                    self.finish("upstream error")
+                    return
+                if rng.random() < panel["reject_rate"]:
+                    self.finish({"error": "Incorrect link"})
+                    return
+                panel["next_id"] += 1
+                outcome = rng.random()
+                outcome = "Canceled" if outcome < panel["cancel_rate"] else \
+                    "Partial" if outcome < panel["cancel_rate"] + panel["partial_rate"] else "Completed"
+                panel["orders"][str(panel["next_id"])] = (time.monotonic(), outcome)
+                panel["added"] += 1
+                self.finish({"order": panel["next_id"]})
+            elif action == "status":
+                result = {}
+                for provider_order_id in self.get_body_argument("orders").split(","):
+                    created, outcome = panel["orders"][provider_order_id]
+                    status = "In progress" if time.monotonic() - created < panel["complete_after"] else outcome
+                    remains = PARTIAL_REMAINS if status == "Partial" else 0
+                    result[provider_order_id] = {"status": status, "charge": "0.1", "remains": str(remains)}
+                panel["status_calls"] += 1
+                self.finish(result)
+            else:
+                self.finish({"error": "Incorrect request"})
+        finally:
+            panel["in_flight"] -= 1
+
+
+async def main_async(args):
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix="bot-fulfillment-"), "bot_data.db")
+    await database.init_db()
+
+    panel = {"latency": args.latency / 1000, "error_rate": args.error_rate, "reject_rate": args.reject_rate,
+             "cancel_rate": args.cancel_rate, "partial_rate": args.partial_rate, "complete_after": args.complete_after, "rng": random.Random(args.seed),
+             "orders": {}, "next_id": 0, "added": 0, "status_calls": 0, "in_flight": 0, "max_in_flight": 0,
+             "connections": set()}
+    server = tornado.web.Application([(r"/api/v2", StubSmmPanel, {"panel": panel})]).listen(args.port, address="127.0.0.1")
+
+    users = list(range(10_000, 10_000 + args.orders))
+    await database.bulk_update_balances([(user_id, PRICE) for user_id in users])
+    for user_id in users:
+        await database.place_order(user_id, "tiktok_like", AMOUNT, f"https://www.tiktok.com/@user{user_id}/video/1", PRICE)
+
+    notified = {"completed": 0, "partial": 0, "failed": 0}
+
+    async def on_completed(completed):
+        notified["completed"] += len(completed)
+
+    async def on_partial(partial):
+        notified["partial"] += len(partial)
+
+    async def on_failed(failed):
+        notified["failed"] += len(failed)
+
+    provider = fulfillment.SmmPanelProvider(f"http://127.0.0.1:{args.port}/api/v2", "stub-key", {"tiktok_like": "1"},
+                                            max_connections=args.connections)
+    worker = fulfillment.FulfillmentWorker(provider, ["tiktok_like"], on_completed, on_partial, on_failed,
+                                           batch_size=args.batch_size, max_attempts=args.max_attempts, retry_delay=1)
+    started = time.perf_counter()
+    rounds = 0
+    try:
+        while notified["completed"] + notified["partial"] + notified["failed"] < args.orders:
+            await worker.run_once()
+            rounds += 1
+            await asyncio.sleep(args.interval)
+    finally:
+        await provider.close()
+        server.stop()
+    elapsed = time.perf_counter() - started
+
+    partial_provider_ids = {provider_order_id for provider_order_id, (_, outcome) in panel["orders"].items() if outcome == "Partial"}
+    partial_ids = {order_id for order_id, provider_order_id in
+                   database.get_connection().execute("SELECT order_id, provider_order_id FROM orders")
+                   if provider_order_id in partial_provider_ids}
+    statuses = {}
+    for order_id in range(1, args.orders + 1):
+        status = (await database.get_order_details(order_id))[4]
+        statuses[status] = statuses.get(status, 0) + 1
+    mismatched = 0
+    wrong_refunds = 0
+    for user_id in users:
+        balance, computed = await database.reconcile_balance(user_id)
+        mismatched += abs(balance - computed) > 1e-9
+        order_id, _, _, _, order_status, _, _ = (await database.get_user_orders_page(user_id, 1))[0][0]
+        expected = PRICE if order_status == "failed" else PRICE * PARTIAL_REMAINS / AMOUNT if order_id in partial_ids else 0
+        wrong_refunds += abs(balance - expected) > 1e-9
+    await database.close_db()
+
+    print(f"{args.orders} orders in {elapsed:.2f}s ({args.orders / elapsed:.0f} orders/s), {rounds} worker rounds")
+    print(f"final statuses: {statuses}; notified completed={notified['completed']} partial={notified['partial']} "
+          f"failed={notified['failed']}")
+    print(f"panel: {panel['added']} accepted, {panel['status_calls']} status calls, "
+          f"{len(panel['connections'])} TCP connections, max {panel['max_in_flight']} requests in flight")
+    print(f"balances: {mismatched} ledger mismatches, {wrong_refunds} wrong refunds")
+    return 1 if mismatched or wrong_refunds or statuses.get("processing") or statuses.get("pending") else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--connections", type=int, default=10, help="httpx hovuzunda ən çox bağlantı")
+    parser.add_argument("--latency", type=float, default=20, help="panelin hər cavabına gecikmə (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="add sorğularının 500 qaytaran payı")
+    parser.add_argument("--reject-rate", type=float, default=0.01)
+    parser.add_argument("--cancel-rate", type=float, default=0.02)
+    parser.add_argument("--partial-rate", type=float, default=0.02)
+    parser.add_argument("--complete-after", type=float, default=0.5, help="sifarişin paneldə tamamlanma müddəti (saniyə)")
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.1, help="run_once çağırışları arasında saniyə")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=18095)
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Mətn marşrutlaşdırılması və sifariş təhlili üçün mikrobenchmark.
+
+Köhnə yol (if/elif zənciri, hər dəfə re.match ilə inline pattern, substring yoxlamaları)
+yeni yolla (dict dispatch + order_parser.parse_order) müqayisə olunur.
+
+İstifadə (repo kökündən): python -m benchmarks.bench_order_parser [iterasiya_sayı]
+"""
+import random
+import re
+import sys
+import timeit
+
+from order_parser import parse_order
+
+AWAITING_LINK = 1
+AWAITING_RECEIPT = 2
+AWAITING_ADMIN_REPLY = 3
+
+MENU_LABELS = ("balans artır", "balansa baxmaq", "xidmətlər", "adminlə əlaqə")
+
+# Real trafikə yaxın qarışıq: (mətn, vəziyyət, kateqoriya)
+MESSAGE_MIX = (
+    [(label, None, "") for label in MENU_LABELS] * 10
+    + [("3k like", None, "tiktok"), ("2.5k follower", None, "tiktok"), ("500 like", None, "instagram"),
+       ("1k follower", None, "instagram"), ("10k view", None, "instagram"), ("1k abuneci", None, "telegram"),
+       ("10k baxis", None, "telegram"), ("2k bəyəni", None, "tiktok"), ("5k izləyici", None, "instagram")] * 5
+    + [("https://t.me/some_channel/123", AWAITING_LINK, "telegram")] * 10
+    + [("salam, balansım artmayıb", AWAITING_ADMIN_REPLY, "")] * 5
+    + [("nə var nə yox", None, "")] * 5
+)
+
+
+def legacy_route(text, state, category):
+    """main.handle_text_message-in əvvəlki if/elif versiyasının marşrut hissəsi."""
+    if text == "balans artır":
+        return "top_up"
+    elif text == "balansa baxmaq":
+        return "balance"
+    elif text == "xidmətlər":
+        return "services"
+    elif text == "adminlə əlaqə":
+        return "contact"
+    elif state == AWAITING_LINK:
+        return "link"
+    elif state == AWAITING_ADMIN_REPLY:
+        return "forward"
+    match = re.match(r"(\d+\.?\d*)\s*(k)?\s*(like|follower|view|abuneci|baxis)", text)
+    if not match:
+        return None
+    num_str, k_prefix, service_keyword = match.groups()
+    amount = float(num_str) * (1000 if k_prefix else 1)
+    if "like" in service_keyword:
+        service = "tiktok_like" if "tiktok" in category else "instagram_like"
+    elif "follower" in service_keyword:
+        service = "tiktok_follower" if "tiktok" in category else "instagram_follower"
+    elif "view" in service_keyword:
+        service = "tiktok_view" if "tiktok" in category else ("instagram_view" if "instagram" in category else "telegram_view")
+    elif "abuneci" in service_keyword:
+        service = "telegram_subscriber"
+    else:
+        service = "telegram_view"
+    return amount, service
+
+
+MENU_ROUTES = {"balans artır": "top_up", "balansa baxmaq": "balance", "xidmətlər": "services", "adminlə əlaqə": "contact"}
+STATE_ROUTES = {AWAITING_LINK: "link", AWAITING_ADMIN_REPLY: "forward"}
+
+
+def table_route(text, state, category):
+    """Yeni yol: menyu və vəziyyət üçün dict, sifariş üçün əvvəlcədən kompilyasiya olunmuş parser."""
+    route = MENU_ROUTES.get(text) or STATE_ROUTES.get(state)
+    if route is not None:
+        return route
+    parsed = parse_order(text, category)
+    return parsed and (parsed[0], parsed[2])
+
+
+def run(path, messages):
+    for text, state, category in messages:
+        path(text, state, category)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    messages = list(MESSAGE_MIX)
+    random.Random(42).shuffle(messages)
+
+    # Yeni parser köhnənin tanıdığı bütün mesajları eyni xidmətə yönləndirməlidir
+    for text, state, category in messages:
+        legacy = legacy_route(text, state, category)
+        if legacy is not None:
+            assert table_route(text, state, category) == legacy, (text, legacy)
+
+    total = iterations * len(messages)
+    for name, path in (("legacy if/elif", legacy_route), ("table + parser", table_route)):
+        seconds = min(timeit.repeat(lambda: run(path, messages), number=iterations, repeat=3))
+        print(f"{name:16s} {seconds * 1e9 / total:8.0f} ns/message  ({total} messages)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Çoxprosesli webhook rejimi üçün uçdan-uca throughput benchmark.
+
+Bot (python main.py) ayrıca prosesdə WORKERS=1, 2, 4 ... ilə webhook rejimində işə salınır; Bot API
+yerinə bu skriptdəki lokal stub server işləyir (TELEGRAM_BASE_URL). Skript çoxlu istifadəçidən
+update-ləri webhook-a göndərir və bütün cavab mesajları stub-a çatana qədər keçən vaxtı ölçür.
+Hər update bir cavab mesajı yaradır, ona görə update/s = cavab/s.
+
+İstifadə (repo kökündən):
+    python -m benchmarks.bench_workers --workers 1 2 4 --users 200 --updates 4000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import tornado.httpclient
+import tornado.web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_TOKEN = "123456:STUB-TOKEN"
+ADMIN_ID = 1000
+SECRET = "bench-secret"
+
+# Hər biri tam bir cavab mesajı ilə nəticələnən mesajlar
+MESSAGES = ("/start", "Xidmətlər", "Balansa baxmaq", "Balans artır", "3k like")
+
+
+class StubBotAPI(tornado.web.RequestHandler):
+    """Bot API metodlarına uğurlu cavab verir və göndərilən mesajları sayır."""
+
+    def initialize(self, state):
+        self.state = state
+
+    def post(self, method):
+        self.get(method)
+
+    def get(self, method):
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+        elif method in ("sendMessage", "editMessageText", "sendPhoto"):
+            self.state["message_id"] += 1
+            self.state["sent"] += 1
+            if self.state["sent"] >= self.state["expected"]:
+                self.state["done"].set()
+            chat_id = int(json.loads(self.get_body_argument("chat_id", "0")))
+            result = {"message_id": self.state["message_id"], "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "text": ""}
+        else:
+            result = True
+        self.finish({"ok": True, "result": result})
+
+
+def make_update(update_id, user_id, text):
+    message = {"message_id": update_id, "date": int(time.time()), "text": text,
+               "chat": {"id": user_id, "type": "private"},
+               "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return json.dumps({"update_id": update_id, "message": message}).encode()
+
+
+async def wait_healthy(client, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.fetch(url)
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("bot did not become healthy")
+
+
+async def run_once(workers, users, updates, concurrency, api_port, bot_port):
+    state = {"sent": 0, "expected": updates, "message_id": 0, "done": asyncio.Event()}
+    api = tornado.web.Application([(r"/bot[^/]+/(\w+)", StubBotAPI, {"state": state})])
+    api_server = api.listen(api_port, address="127.0.0.1")
+
+    env = dict(os.environ, BOT_TOKEN=BOT_TOKEN, ADMIN_ID=str(ADMIN_ID), WORKERS=str(workers), PORT=str(bot_port),
+               WEBHOOK_URL="https://bench.invalid", WEBHOOK_SECRET_TOKEN=SECRET, WEBHOOK_LISTEN="127.0.0.1",
+               TELEGRAM_BASE_URL=f"http://127.0.0.1:{api_port}/bot", STATE_PERSISTENCE="0",
+               SEND_PER_CHAT_INTERVAL="0", FLOOD_CONTROL="0", PYTHONPATH=ROOT) # yük flood limitlərinə düşməsin
+    env.pop("METRICS_PORT", None)
+    bot = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], env=env, cwd=tempfile.mkdtemp(prefix="bot-bench-"),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = tornado.httpclient.AsyncHTTPClient(max_clients=concurrency)
+    try:
+        await wait_healthy(client, f"http://127.0.0.1:{bot_port}/healthz")
+        bodies = [make_update(i + 1, 1 + i % users, MESSAGES[(i // users) % len(MESSAGES)]) for i in range(updates)]
+        webhook = f"http://127.0.0.1:{bot_port}/telegram"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def post(body):
+            async with semaphore:
+                await client.fetch(webhook, method="POST", body=body, headers=headers)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(body) for body in bodies))
+        await asyncio.wait_for(state["done"].wait(), timeout=300)
+        return updates / (time.perf_counter() - started)
+    finally:
+        bot.terminate()
+        bot.wait()
+        api_server.stop()
+
+
+async def main_async(args):
+    baseline = None
+    print(f"{'workers':>8} {'updates/s':>10} {'speedup':>8}   ({os.cpu_count()} CPU)")
+    for workers in args.workers:
+        rate = await run_once(workers, args.users, args.updates, args.concurrency, args.api_port, args.port)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.0f} {rate / baseline:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=40, help="eyni anda açıq webhook sorğuları")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--api-port", type=int, default=18081)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""İdarəçi səviyyəsində replay benchmark.
+
+Bütün axınlar üçün sintetik Update-lər (/start, xidmət menyuları, sifariş -> link -> yerləşdirmə,
+çek şəkli, admin /add, /done, /orders, /set_price, /stats, Sifarişlərim) qurulur və stub Bot ilə real Application-dan
+keçirilir. Hər axın üçün p50/p95/p99 gecikmə, saniyədə update sayı və update başına SQLite
+sorğu/bağlantı sayı göstərilir.
+
+İstifadə (repo kökündən):
+    python -m benchmarks.replay --users 2000
+    python -m benchmarks.replay --users 2000 --json baseline.json
+    python -m benchmarks.replay --users 2000 --baseline baseline.json --tolerance 0.25
+    python -m benchmarks.replay --users 2000 --concurrency 64 --api-latency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+ADMIN_ID = 1000
+
+# config.py .env-i yükləməzdən əvvəl — mövcud dəyişənlər üzərinə yazılmır
+os.environ["BOT_TOKEN"] = "123456:STUB-TOKEN"
+os.environ["ADMIN_ID"] = str(ADMIN_ID)
+
+from telegram import Update # noqa: E402
+from telegram.ext import Application # noqa: E402
+from telegram.request import BaseRequest # noqa: E402
+
+import database # noqa: E402
+import main # noqa: E402
+
+ORDER_ID_PATTERN = re.compile(r"Sifarişiniz \(`(\d+)`\)")
+FORWARD_PATTERN = re.compile(r"İstifadəçidən mesaj \(`(\d+)`\)")
+RECEIPT_PATTERN = re.compile(r"Ödəniş çeki #(\d+)\*\*\nİstifadəçi ID: `(\d+)`")
+
+
+class DbCounter:
+    """SQLite bağlantılarını və icra olunan sorğuları sayır (trace callback ilə)."""
+
+    def __init__(self):
+        self.statements = 0
+        self.connections = 0
+
+    def on_statement(self, statement):
+        self.statements += 1
+
+    def install(self):
+        real_connect = sqlite3.connect
+
+        def counting_connect(*args, **kwargs):
+            conn = real_connect(*args, **kwargs)
+            self.connections += 1
+            conn.set_trace_callback(self.on_statement)
+            return conn
+
+        sqlite3.connect = counting_connect
+
+
+class StubRequest(BaseRequest):
+    """Telegram Bot API-ni şəbəkəsiz təqlid edir və göndərilən mesajları qeyd edir."""
+
+    def __init__(self, api_latency=0.0):
+        self.api_latency = api_latency
+        self.calls = 0
+        self.message_id = 0
+        self.order_ids = {} # {chat_id: son sifariş ID-si}
+        self.receipt_ids = {} # {user_id: adminə göndərilən son çek ID-si}
+        self.forwarded_ids = {} # {user_id: adminə yönləndirilmiş son mesajın ID-si}
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params):
+        self.message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+        elif endpoint in ("sendMessage", "editMessageText", "sendPhoto", "sendDocument"):
+            result = self._message(params)
+            match = ORDER_ID_PATTERN.search(params.get("text", ""))
+            if match:
+                self.order_ids[result["chat"]["id"]] = int(match.group(1))
+            match = FORWARD_PATTERN.search(params.get("text", ""))
+            if match:
+                self.forwarded_ids[int(match.group(1))] = result["message_id"]
+            match = RECEIPT_PATTERN.search(params.get("caption", ""))
+            if match:
+                self.receipt_ids[int(match.group(2))] = int(match.group(1))
+        elif endpoint == "sendMediaGroup":
+            result = [self._message(params) for _ in params.get("media", [])]
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class UpdateFactory:
+    def __init__(self, bot):
+        self.bot = bot
+        self.update_id = 0
+        self.message_id = 0
+
+    def _next_ids(self):
+        self.update_id += 1
+        self.message_id += 1
+        return self.update_id, self.message_id
+
+    @staticmethod
+    def _user(user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def _message(self, user_id, message_id, **fields):
+        return {"message_id": message_id, "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id), **fields}
+
+    def text(self, user_id, text, reply_to=None):
+        update_id, message_id = self._next_ids()
+        fields = {"text": text}
+        if reply_to is not None:
+            fields["reply_to_message"] = {"message_id": reply_to, "date": int(time.time()),
+                                          "chat": {"id": user_id, "type": "private"}, "text": "forwarded"}
+        if text.startswith("/"):
+            fields["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": update_id, "message": self._message(user_id, message_id, **fields)}, self.bot)
+
+    def photo(self, user_id):
+        update_id, message_id = self._next_ids()
+        photo = [{"file_id": f"receipt-{user_id}", "file_unique_id": f"u{user_id}", "width": 800, "height": 600}]
+        return Update.de_json({"update_id": update_id, "message": self._message(user_id, message_id, photo=photo)}, self.bot)
+
+    def callback(self, user_id, data):
+        update_id, message_id = self._next_ids()
+        query = {
+            "id": str(update_id),
+            "from": self._user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {"message_id": message_id, "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"}, "text": "menu"},
+        }
+        return Update.de_json({"update_id": update_id, "callback_query": query}, self.bot)
+
+
+def user_script(factory, request, user_id):
+    """Bir istifadəçinin tam yolu: menyu, çek, admin təsdiqi, sifariş və tamamlanma."""
+    return [
+        ("start", lambda: factory.text(user_id, "/start")),
+        ("services_menu", lambda: factory.text(user_id, "Xidmətlər")),
+        ("services_tiktok", lambda: factory.callback(user_id, "services_tiktok")),
+        ("top_up_menu", lambda: factory.text(user_id, "Balans artır")),
+        ("receipt_photo", lambda: factory.photo(user_id)),
+        ("admin_approve", lambda: factory.callback(ADMIN_ID, f"receipt_approve_{request.receipt_ids.get(user_id, 0)}_50")),
+        ("order_parse", lambda: factory.text(user_id, "3k like")),
+        ("order_link", lambda: factory.text(user_id, f"https://www.tiktok.com/user{user_id}/video/1")),
+        ("admin_done", lambda: factory.text(ADMIN_ID, f"/done {request.order_ids.get(user_id, 0)}")),
+        ("my_orders", lambda: factory.text(user_id, "Sifarişlərim")),
+        ("contact_admin", lambda: factory.text(user_id, "Adminlə əlaqə")),
+        ("contact_message", lambda: factory.text(user_id, "Sifarişim nə vaxt hazır olacaq?")),
+        ("admin_reply", lambda: factory.text(ADMIN_ID, "Bir saata hazır olacaq.", reply_to=request.forwarded_ids.get(user_id, 0))),
+    ]
+
+
+def admin_script(factory):
+    return [
+        ("admin_orders", lambda: factory.text(ADMIN_ID, "/orders")),
+        ("admin_stats", lambda: factory.text(ADMIN_ID, "/stats")),
+        ("admin_set_price", lambda: factory.text(ADMIN_ID, "/set_price")),
+        ("admin_set_price_pick", lambda: factory.callback(ADMIN_ID, "set_price_tiktok_like")),
+        ("admin_set_price_amount", lambda: factory.text(ADMIN_ID, "1.50")),
+    ]
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def replay(users, seed, concurrency=1, api_latency=0.0):
+    counter = DbCounter()
+    counter.install()
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix="bot-replay-"), "bot_data.db")
+
+    request = StubRequest(api_latency)
+    builder = Application.builder().token(os.environ["BOT_TOKEN"]).request(request)
+    if concurrency > 1:
+        builder = builder.concurrent_updates(main.PerUserUpdateProcessor(concurrency))
+    application = builder.build()
+    main.register_handlers(application)
+    # Replay istifadəçilərin addımlarını sıxılmış zamanda göndərir; flood limitləri onları atardı
+    main.FLOOD_CONTROL.limits = {}
+    errors = []
+
+    async def record_error(update, context):
+        errors.append(repr(context.error))
+
+    application.add_error_handler(record_error)
+    await application.initialize()
+    await main.post_init(application)
+
+    factory = UpdateFactory(application.bot)
+    scripts = [user_script(factory, request, 10_000 + i) for i in range(users)]
+    scripts += [admin_script(factory) for _ in range(max(1, users // 100))]
+    rng = random.Random(seed)
+
+    drain = database.run_in_db_thread(lambda: None)
+    await drain()
+    stats = {} # {flow: [latencies, statements, connections]}
+    started = time.perf_counter()
+    processed = 0
+
+    if concurrency > 1:
+        # Hər skript öz addımlarını ardıcıl göndərir, skriptlər isə update processor-un limiti ilə paralel işləyir.
+        # Sorğular axınlar arasında qarışdığı üçün yalnız ümumi say hesablanır.
+        async def process_and_signal(update, done):
+            try:
+                await application.process_update(update)
+            finally:
+                done.set_result(None)
+
+        async def run_script(script):
+            nonlocal processed
+            for flow, build_update in script:
+                update = build_update()
+                done = asyncio.get_running_loop().create_future()
+                t0 = time.perf_counter()
+                # Məşğul zolaqda processor dərhal qayıdır, ona görə update-in özünün bitməsi gözlənilir
+                await application.update_processor.process_update(update, process_and_signal(update, done))
+                await done
+                stats.setdefault(flow, [[], None, None])[0].append(time.perf_counter() - t0)
+                processed += 1
+
+        statements_before, connections_before = counter.statements, counter.connections
+        await asyncio.gather(*(run_script(script) for script in scripts))
+        await drain()
+        scripts = []
+        total_statements = counter.statements - statements_before
+        total_connections = counter.connections - connections_before
+
+    while scripts:
+        index = rng.randrange(len(scripts))
+        flow, build_update = scripts[index].pop(0)
+        if not scripts[index]:
+            scripts[index] = scripts[-1]
+            scripts.pop()
+
+        update = build_update()
+        statements_before, connections_before = counter.statements, counter.connections
+        t0 = time.perf_counter()
+        await application.process_update(update)
+        elapsed = time.perf_counter() - t0
+        await drain() # fon yazılarını da bu update-ə aid et
+        entry = stats.setdefault(flow, [[], 0, 0])
+        entry[0].append(elapsed)
+        entry[1] += counter.statements - statements_before
+        entry[2] += counter.connections - connections_before
+        processed += 1
+    wall = time.perf_counter() - started
+    if concurrency <= 1:
+        total_statements = sum(entry[1] for entry in stats.values())
+        total_connections = sum(entry[2] for entry in stats.values())
+
+    await main.post_shutdown(application)
+    await application.shutdown()
+
+    report = {"updates": processed, "seconds": wall, "updates_per_second": processed / wall,
+              "concurrency": concurrency, "api_latency_ms": api_latency * 1000,
+              "statements_per_update": total_statements / processed,
+              "connections_per_update": total_connections / processed,
+              "api_calls": request.calls, "errors": len(errors), "flows": {}}
+    for flow, (latencies, statements, connections) in sorted(stats.items()):
+        latencies.sort()
+        report["flows"][flow] = {
+            "count": len(latencies),
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "statements_per_update": statements / len(latencies) if statements is not None else None,
+            "connections_per_update": connections / len(latencies) if connections is not None else None,
+        }
+    return report, errors
+
+
+def print_report(report):
+    print(f"{'flow':24s} {'count':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'stmts/upd':>10s} {'conns/upd':>10s}")
+    for flow, row in report["flows"].items():
+        statements = "-" if row["statements_per_update"] is None else f"{row['statements_per_update']:.2f}"
+        connections = "-" if row["connections_per_update"] is None else f"{row['connections_per_update']:.2f}"
+        print(f"{flow:24s} {row['count']:7d} {row['p50_ms']:8.2f} {row['p95_ms']:8.2f} {row['p99_ms']:8.2f} "
+              f"{statements:>10s} {connections:>10s}")
+    print(f"\n{report['updates']} updates in {report['seconds']:.2f}s = {report['updates_per_second']:.0f} updates/s "
+          f"(concurrency {report['concurrency']}, API latency {report['api_latency_ms']:.0f} ms)")
+    print(f"{report['statements_per_update']:.2f} SQLite statements and {report['connections_per_update']:.3f} connections per update, "
+          f"{report['api_calls']} Bot API calls, {report['errors']} errors")
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """p95 və ya sorğu sayı baseline-dan tolerance qədər pisləşibsə xəbərdarlıq siyahısı qaytarır."""
+    regressions = []
+    for flow, row in report["flows"].items():
+        base = baseline["flows"].get(flow)
+        if base is None:
+            continue
+        for metric in ("p95_ms", "statements_per_update"):
+            if row[metric] is None or base[metric] is None:
+                continue
+            if row[metric] > base[metric] * (1 + tolerance) + 1e-9:
+                regressions.append(f"{flow}.{metric}: {base[metric]:.2f} -> {row[metric]:.2f}")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help=">1 olduqda skriptlər PerUserUpdateProcessor ilə paralel işləyir")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="hər Bot API çağırışına əlavə gecikmə (ms)")
+    parser.add_argument("--json", help="hesabatı bu fayla yaz")
+    parser.add_argument("--baseline", help="əvvəlki --json hesabatı ilə müqayisə et")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report, errors = asyncio.run(replay(args.users, args.seed, args.concurrency, args.api_latency / 1000))
+    print_report(report)
+    for error in errors[:5]:
+        print("error:", error)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
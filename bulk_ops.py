@@ -0,0 +1,66 @@
+import csv
+import io
+import re
+
+# Toplu admin əməliyyatları üçün giriş təhlili: CSV (user_id,amount) və sifariş ID siyahıları/aralıqları
+
+ORDER_ID_TOKEN = re.compile(r"^(\d+)(?:-(\d+))?$")
+ORDER_ID_SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def parse_balance_csv(text, max_rows):
+    """`user_id,amount` sətirlərini oxuyur.
+
+    ([(user_id, amount), ...], [xəta mesajı, ...]) qaytarır. Başlıq sətri (rəqəm olmayan) və boş sətirlər ötürülür.
+    """
+    entries = []
+    errors = []
+    sample = text[:1024]
+    delimiter = ";" if sample.count(";") > sample.count(",") else ","
+    for line_number, row in enumerate(csv.reader(io.StringIO(text), delimiter=delimiter), start=1):
+        row = [cell.strip() for cell in row]
+        if not any(row):
+            continue
+        if line_number == 1 and not row[0].lstrip("-").isdigit():
+            continue # başlıq
+        if len(row) < 2:
+            errors.append(f"Sətir {line_number}: iki sütun olmalıdır (user_id,amount)")
+            continue
+        try:
+            user_id = int(row[0])
+            amount = float(row[1].replace(",", "."))
+        except ValueError:
+            errors.append(f"Sətir {line_number}: ID və ya məbləğ düzgün deyil")
+            continue
+        if amount <= 0:
+            errors.append(f"Sətir {line_number}: məbləğ müsbət olmalıdır")
+            continue
+        entries.append((user_id, amount))
+        if len(entries) > max_rows:
+            return [], [f"Faylda {max_rows}-dən çox sətir var."]
+    return entries, errors
+
+
+def parse_order_ids(text, max_ids):
+    """"1, 2 5-10" kimi siyahını sifariş ID-lərinə açır.
+
+    (sıralanmış unikal ID-lər, [xəta mesajı, ...]) qaytarır.
+    """
+    order_ids = set()
+    errors = []
+    for token in ORDER_ID_SEPARATORS.split(text.strip()):
+        if not token:
+            continue
+        match = ORDER_ID_TOKEN.match(token)
+        if not match:
+            errors.append(f"`{token}` sifariş ID-si deyil")
+            continue
+        start = int(match.group(1))
+        end = int(match.group(2) or start)
+        if end < start:
+            errors.append(f"`{token}` aralığı düzgün deyil")
+            continue
+        if len(order_ids) + end - start + 1 > max_ids:
+            return [], [f"Bir dəfəyə ən çox {max_ids} sifariş tamamlamaq olar."]
+        order_ids.update(range(start, end + 1))
+    return sorted(order_ids), errors
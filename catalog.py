@@ -0,0 +1,63 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import database
+
+# Xidmət qiymətlərinin yaddaşdakı surəti. Menyulara baxmaq verilənlər bazasına müraciət etmir;
+# qiymət dəyişdikdə keş və hazır menyular yenidən qurulur.
+PRICES = {} # {service_name: price_per_k}
+MENUS = {} # {category: (text, reply_markup)}
+
+# Hər kateqoriya üçün: başlıq, (xidmət, sətir adı) siyahısı və nümunə sifariş
+MENU_LAYOUT = {
+    "tiktok": (
+        "Tiktok Xidmətləri",
+        [("tiktok_like", "1000 Bəyəni (Like)"),
+         ("tiktok_follower", "1000 İzləyici (Follower)"),
+         ("tiktok_view", "1000 Baxış (View)")],
+        '"3k like" və ya "2.5k follower"',
+    ),
+    "instagram": (
+        "Instagram Xidmətləri",
+        [("instagram_like", "1000 Bəyəni (Like)"),
+         ("instagram_follower", "1000 İzləyici (Follower)"),
+         ("instagram_view", "1000 Baxış (View)")],
+        '"500 like" və ya "1k follower"',
+    ),
+    "telegram": (
+        "Telegram Xidmətləri",
+        [("telegram_subscriber", "1000 Kanal Abunəçisi"),
+         ("telegram_view", "1000 Post Baxışı")],
+        '"1k abuneci" və ya "10k baxış"',
+    ),
+}
+
+BACK_TO_SERVICES_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("Geri", callback_data="services_menu")]])
+
+def _render_menus():
+    """Bütün kateqoriyaların menyu mətnini keşdəki qiymətlərlə yenidən qurur."""
+    for category, (title, lines, example) in MENU_LAYOUT.items():
+        price_lines = "\n".join(f"- {label}: {PRICES.get(service, 0.0):.2f} AZN" for service, label in lines)
+        text = (f"**{title}:**\n\n{price_lines}\n\n"
+                f"Sifariş vermək üçün istədiyiniz sayı və xidməti qeyd edin (məs: {example}).")
+        MENUS[category] = (text, BACK_TO_SERVICES_MARKUP)
+
+async def load():
+    """Qiymətləri verilənlər bazasından oxuyur və menyuları hazırlayır (başlanğıcda çağırılır)."""
+    services = await database.get_all_services()
+    PRICES.clear()
+    PRICES.update(services)
+    _render_menus()
+
+def get_price(service_name):
+    return PRICES.get(service_name)
+
+def get_menu(category):
+    """(text, reply_markup) qaytarır və ya kateqoriya yoxdursa None."""
+    return MENUS.get(category)
+
+async def set_price(service_name, new_price):
+    """Qiyməti verilənlər bazasında yeniləyir və keşi/menyuları yenidən qurur."""
+    await database.update_service_price(service_name, new_price)
+    if service_name in PRICES:
+        PRICES[service_name] = new_price
+        _render_menus()
@@ -1,5 +1,6 @@
 # config.py
 import os
+import secrets
 from dotenv import load_dotenv
 
 # .env faylını yüklə (yerli inkişaf üçün)
@@ -7,3 +8,101 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN") # Bu sətri də yoxlayın, düzgün adlı dəyişəndən oxuduğundan əmin olun
 ADMIN_ID = int(os.getenv("ADMIN_ID")) # Düzgün ətraf mühit dəyişəni adı olaraq "ADMIN_ID" istifadə edin
+
+# Söhbət vəziyyəti (USER_STATES və sifariş qaralamaları)
+STATE_TTL_SECONDS = int(os.getenv("STATE_TTL_SECONDS", "3600")) # Bu müddətdə toxunulmayan vəziyyət silinir
+STATE_MAX_ENTRIES = int(os.getenv("STATE_MAX_ENTRIES", "100000")) # Yaddaşda saxlanılan maksimum vəziyyət sayı
+STATE_PERSISTENCE = os.getenv("STATE_PERSISTENCE", "1") == "1" # Vəziyyətləri SQLite-da saxla (yenidən başladıqda itməsin)
+
+# Telegram-a gedən mesajların tempi (SendQueue)
+SEND_RATE_PER_SECOND = float(os.getenv("SEND_RATE_PER_SECOND", "25")) # Telegram-ın ümumi limiti ~30 mesaj/saniyədir
+SEND_PER_CHAT_INTERVAL = float(os.getenv("SEND_PER_CHAT_INTERVAL", "1.0")) # Eyni çata iki mesaj arasında minimum saniyə
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "200")) # Hər partiyadan sonra irəliləyiş yadda saxlanılır
+
+# Admin bildirişləri üçün digest rejimi
+ADMIN_DIGEST_ENABLED = os.getenv("ADMIN_DIGEST_ENABLED", "0") == "1"
+ADMIN_DIGEST_INTERVAL = float(os.getenv("ADMIN_DIGEST_INTERVAL", "30")) # Saniyə
+ADMIN_DIGEST_MAX_ITEMS = int(os.getenv("ADMIN_DIGEST_MAX_ITEMS", "20")) # Bu sayda sifariş toplananda dərhal göndər
+
+# Prometheus metrikləri üçün HTTP portu (boşdursa söndürülüb)
+METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+
+# Eyni anda emal olunan update-lərin maksimum sayı (eyni istifadəçinin update-ləri həmişə ardıcıldır)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+# Balans ledger-i üçün snapshot işi
+LEDGER_SNAPSHOT_INTERVAL = float(os.getenv("LEDGER_SNAPSHOT_INTERVAL", "3600")) # Saniyə
+LEDGER_SNAPSHOT_MIN_ENTRIES = int(os.getenv("LEDGER_SNAPSHOT_MIN_ENTRIES", "20")) # Bundan az yeni yazısı olan istifadəçi ötürülür
+
+# Toplu admin əməliyyatları (/add CSV faylı, /done siyahı və aralıqlarla)
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "5000")) # Bir fayl/əmrdə ən çox sətir və ya sifariş
+BULK_MAX_FILE_SIZE = int(os.getenv("BULK_MAX_FILE_SIZE", str(1024 * 1024))) # Bayt
+
+# /export faylının ən böyük ölçüsü: Bot API bot-un yüklədiyi faylı 50 MB ilə məhdudlaşdırır (lokal Bot API serverində çox)
+EXPORT_MAX_FILE_SIZE = int(os.getenv("EXPORT_MAX_FILE_SIZE", str(50 * 1024 * 1024))) # Bayt
+
+# Çek düymələrindəki hazır məbləğlər (AZN)
+RECEIPT_PRESET_AMOUNTS = [float(amount) for amount in os.getenv("RECEIPT_PRESET_AMOUNTS", "5,10,20,50").split(",")]
+
+# Admin cavabları: adminə yönləndirilmiş mesaj -> istifadəçi xəritəsi
+ADMIN_MESSAGES_RETENTION_DAYS = int(os.getenv("ADMIN_MESSAGES_RETENTION_DAYS", "30")) # Bundan köhnə sətirlər silinir
+ADMIN_MESSAGES_PRUNE_INTERVAL = float(os.getenv("ADMIN_MESSAGES_PRUNE_INTERVAL", "86400")) # Saniyə
+ADMIN_REPLY_CACHE_SIZE = int(os.getenv("ADMIN_REPLY_CACHE_SIZE", "10000")) # Yaddaşda saxlanılan son xəritələr
+
+# Köhnə bağlanmış sifarişlərin arxivə köçürülməsi və faylın kiçildilməsi
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30")) # Bundan köhnə tamamlanmış/qaytarılmış sifarişlər arxivə gedir
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "86400")) # Saniyə
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500")) # Bir tranzaksiyada köçürülən sifariş sayı
+
+# Webhook rejimi (WEBHOOK_URL boşdursa polling istifadə olunur)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") # Məs. https://bot.onrender.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram") # Bot tokeni URL-də görünməsin deyə ayrıca yol
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN") or secrets.token_urlsafe(32) # Verilməyibsə hər başlanğıcda yenisi
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")) # Telegram-ın eyni anda açdığı bağlantılar (1-100)
+WEBHOOK_DROP_PENDING_UPDATES = os.getenv("WEBHOOK_DROP_PENDING_UPDATES", "0") == "1"
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8443"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20")) # Saniyə
+
+# Çoxprosesli rejim (yalnız webhook): WORKERS > 1 olduqda update-lər user_id-yə görə worker proseslərinə paylanır
+WORKERS = int(os.getenv("WORKERS", "1"))
+WORKER_INDEX = int(os.getenv("WORKER_INDEX")) if os.getenv("WORKER_INDEX") else None # Worker proseslərinə front-end verir
+WORKER_SHARE = WORKERS if WORKER_INDEX is not None else 1 # Ümumi göndərmə limiti worker-lər arasında bölünür
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "5")) # Worker-lərdə qiymətlərin yenilənməsi (saniyə)
+if WORKER_INDEX is not None and METRICS_PORT:
+    METRICS_PORT += 1 + WORKER_INDEX # Hər worker öz metriklərini ayrıca portda verir
+
+# Bot API ünvanı (məs. lokal Bot API server və ya test stub-u üçün); boşdursa https://api.telegram.org/bot
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL") or "https://api.telegram.org/bot"
+
+# Soyuq başlanğıc
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1" # İlk cavabdan sonra mərhələlərin müddətini log-a yaz
+STARTUP_WARMUP_DELAY = float(os.getenv("STARTUP_WARMUP_DELAY", "30")) # Update gəlməsə, təxirə salınmış işlər bu qədər saniyə sonra başlayır
+
+# İstifadəçi başına flood nəzarəti (bütün handler-lərdən əvvəl, verilənlər bazasına müraciətsiz)
+# Hər update növü üçün: saniyədə neçə update (RATE) və ardıcıl ən çox neçə update (BURST)
+FLOOD_CONTROL_ENABLED = os.getenv("FLOOD_CONTROL", "1") == "1" # "0" — limitlər tətbiq olunmur (məs. yük testlərində)
+FLOOD_LIMITS = {
+    "text": (float(os.getenv("FLOOD_TEXT_RATE", "1")), float(os.getenv("FLOOD_TEXT_BURST", "5"))),
+    "media": (float(os.getenv("FLOOD_MEDIA_RATE", "0.2")), float(os.getenv("FLOOD_MEDIA_BURST", "3"))), # foto, sənəd və s.
+    "callback": (float(os.getenv("FLOOD_CALLBACK_RATE", "2")), float(os.getenv("FLOOD_CALLBACK_BURST", "10"))),
+} if FLOOD_CONTROL_ENABLED else {}
+FLOOD_MUTE_AFTER = int(os.getenv("FLOOD_MUTE_AFTER", "20")) # Bu qədər atılmış update-dən sonra susdur (0 — heç vaxt)
+FLOOD_STRIKE_WINDOW = float(os.getenv("FLOOD_STRIKE_WINDOW", "60")) # Atılmış update-lərin sayıldığı pəncərə (saniyə)
+FLOOD_MUTE_SECONDS = float(os.getenv("FLOOD_MUTE_SECONDS", "600"))
+FLOOD_MAX_TRACKED_USERS = int(os.getenv("FLOOD_MAX_TRACKED_USERS", "100000"))
+
+# Sifarişlərin SMM panelə avtomatik göndərilməsi (FULFILLMENT_API_URL boşdursa söndürülüb, sifarişlər /done ilə bağlanır)
+FULFILLMENT_API_URL = os.getenv("FULFILLMENT_API_URL") # Məs. https://panel.example/api/v2
+FULFILLMENT_API_KEY = os.getenv("FULFILLMENT_API_KEY", "")
+# Bizim xidmət -> panelin xidmət ID-si, məs. "tiktok_like=1234,instagram_follower=567"; siyahıda olmayanlar əl ilə icra olunur
+FULFILLMENT_SERVICES = dict(
+    item.strip().split("=", 1) for item in os.getenv("FULFILLMENT_SERVICES", "").split(",") if item.strip()
+)
+FULFILLMENT_INTERVAL = float(os.getenv("FULFILLMENT_INTERVAL", "15")) # Saniyə
+FULFILLMENT_BATCH_SIZE = int(os.getenv("FULFILLMENT_BATCH_SIZE", "50")) # Bir dəfədə göndərilən sifariş
+FULFILLMENT_POLL_BATCH_SIZE = int(os.getenv("FULFILLMENT_POLL_BATCH_SIZE", "500")) # Bir dəfədə statusu yoxlanılan sifariş
+FULFILLMENT_MAX_ATTEMPTS = int(os.getenv("FULFILLMENT_MAX_ATTEMPTS", "5")) # Bundan sonra sifariş failed olur və məbləğ qaytarılır
+FULFILLMENT_RETRY_DELAY = float(os.getenv("FULFILLMENT_RETRY_DELAY", "30")) # İlk təkrar cəhdə qədər saniyə (hər dəfə ikiqat)
+FULFILLMENT_MAX_CONNECTIONS = int(os.getenv("FULFILLMENT_MAX_CONNECTIONS", "10"))
+FULFILLMENT_TIMEOUT = float(os.getenv("FULFILLMENT_TIMEOUT", "20")) # Saniyə
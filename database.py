@@ -1,11 +1,85 @@
+import asyncio
+import functools
+import logging
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
 
 DATABASE_NAME = "bot_data.db"
 
-def init_db():
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
+logger = logging.getLogger(__name__)
+
+# Bütün sorğular bu tək thread-də, bir uzunömürlü bağlantı üzərində icra olunur.
+# Beləliklə disk yazıları event loop-u bloklamır, yazılar isə ardıcıl qalır.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+_conn = None
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL", # WAL ilə hər commit-də fsync lazım deyil
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000", # ~8 MB səhifə keşi
+)
+
+def get_connection():
+    """Paylaşılan SQLite bağlantısını qaytarır (lazım olduqda yaradır)."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
+        for pragma in PRAGMAS:
+            _conn.execute(pragma)
+    return _conn
+
+def run_in_db_thread(func):
+    """Sinxron funksiyanı verilənlər bazası thread-ində icra edən async funksiyaya çevirir."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+        finally:
+            metrics.DB_LATENCY.observe(time.perf_counter() - started, func.__name__)
+    return wrapper
+
+def _log_background_error(future):
+    if future.exception() is not None:
+        logger.error("Background database write failed: %s", future.exception())
+
+def run_in_background(func):
+    """Sinxron funksiyanı DB thread-ində, nəticəsini gözləmədən icra edən funksiyaya çevirir.
 
+    Bütün çağırışlar eyni növbədən keçdiyi üçün yazıların ardıcıllığı qorunur.
+    """
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.DB_LATENCY.observe(time.perf_counter() - started, func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        future = _executor.submit(timed, *args, **kwargs)
+        future.add_done_callback(_log_background_error)
+        return future
+    return wrapper
+
+@run_in_db_thread
+def close_db():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+# --- Sxem miqrasiyaları ---
+# Hər miqrasiya bir dəfə, öz tranzaksiyasında icra olunur; tətbiq olunmuş sayı PRAGMA user_version-da saxlanılır.
+# Yeni dəyişikliklər yalnız siyahının sonuna əlavə olunmalıdır.
+
+def _migration_initial_schema(cursor):
     # Users table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -58,102 +132,876 @@ def init_db():
         ("telegram_view", 0.30),
     ]
 
-    for service_name, price in services_to_add:
-        cursor.execute("INSERT OR IGNORE INTO services (service_name, price_per_k) VALUES (?, ?)",
-                       (service_name, price))
+    cursor.executemany("INSERT OR IGNORE INTO services (service_name, price_per_k) VALUES (?, ?)",
+                       services_to_add)
 
-    conn.commit()
-    conn.close()
+def _migration_indexes(cursor):
+    # /orders səhifələməsi üçün (timestamp, order_id) açarlı indekslər
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_timestamp ON orders (timestamp, order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, timestamp, order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_service ON orders (service_type, timestamp, order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id, timestamp, order_id)")
+    # get_user_id_from_admin_message_id axtarışı üçün
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_admin_messages_admin_message_id ON admin_messages (admin_message_id)")
 
-def get_user_balance(user_id):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
+def _migration_conversation_state(cursor):
+    # İstifadəçi vəziyyətləri və sifariş qaralamaları (state_store.StateStore)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_state (
+            namespace TEXT,
+            key INTEGER,
+            value TEXT, -- JSON
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_conversation_state_expires_at ON conversation_state (namespace, expires_at)")
+
+def _migration_broadcasts(cursor):
+    # /broadcast irəliləyişi: yenidən başladıqda last_user_id-dən davam edilir
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT,
+            status TEXT DEFAULT 'running',
+            last_user_id INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            finished_at DATETIME
+        )
+    """)
+
+def _migration_ledger(cursor):
+    # Balans artıq qəpiklə (tam ədəd) saxlanılır; users.balance (REAL) köhnə sütundur və yazılmır.
+    # users.balance_qepik ledger-in cəmidir və hər yazı ilə eyni tranzaksiyada yenilənir.
+    cursor.execute("ALTER TABLE users ADD COLUMN balance_qepik INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE users ADD COLUMN entries_since_snapshot INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("UPDATE users SET balance_qepik = CAST(ROUND(COALESCE(balance, 0) * 100) AS INTEGER)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ledger (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount_qepik INTEGER NOT NULL, -- artım müsbət, çıxılma mənfi
+            entry_type TEXT NOT NULL, -- opening, topup, order_debit, refund
+            order_id INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_user ON ledger (user_id, entry_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ledger_order ON ledger (order_id) WHERE order_id IS NOT NULL")
+    # Mövcud balanslar açılış yazısı kimi köçürülür ki, ledger-in cəmi balansa bərabər olsun
+    cursor.execute("INSERT INTO ledger (user_id, amount_qepik, entry_type) "
+                   "SELECT user_id, balance_qepik, 'opening' FROM users WHERE balance_qepik != 0")
+    cursor.execute("UPDATE users SET entries_since_snapshot = 1 WHERE balance_qepik != 0")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS balance_snapshots (
+            user_id INTEGER NOT NULL,
+            entry_id INTEGER NOT NULL, -- bu yazıya qədər (daxil) olan balans
+            balance_qepik INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, entry_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_entries_since_snapshot ON users (entries_since_snapshot) "
+                   "WHERE entries_since_snapshot > 0")
+
+def _migration_receipts(cursor):
+    # İstifadəçilərin göndərdiyi ödəniş çekləri; admin təsdiqləyənə və ya rədd edənə qədər 'pending' qalır
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS receipts (
+            receipt_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending', -- pending, approved, rejected
+            amount_qepik INTEGER, -- təsdiqlənmiş məbləğ
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            resolved_at DATETIME
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_receipts_pending ON receipts (receipt_id) WHERE status = 'pending'")
+
+def _migration_admin_messages_timestamp(cursor):
+    # Köhnə admin_messages sətirlərinin təmizlənməsi (prune_admin_messages) üçün
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_admin_messages_timestamp ON admin_messages (timestamp)")
+
+def _migration_orders_archive(cursor):
+    # Köhnə tamamlanmış sifarişlər archive_orders ilə bura köçürülür ki, orders cədvəli kiçik qalsın
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS orders_archive (
+            order_id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            service_type TEXT,
+            amount REAL,
+            link TEXT,
+            status TEXT,
+            timestamp DATETIME,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_archive_timestamp ON orders_archive (timestamp, order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_archive_user ON orders_archive (user_id, timestamp, order_id)")
+
+def _migration_user_orders_index(cursor):
+    # İstifadəçinin öz sifarişləri (get_user_orders_page) order_id kursoru ilə səhifələnir
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_order ON orders (user_id, order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_archive_user_order ON orders_archive (user_id, order_id)")
+
+def _migration_fulfillment(cursor):
+    # Avtomatik icra (fulfillment.py): pending -> processing -> completed/failed.
+    # provider_order_id — provayderin sifariş ID-si; next_attempt_at — uğursuz göndərişdən sonra növbəti cəhd vaxtı
+    cursor.execute("ALTER TABLE orders ADD COLUMN provider_order_id TEXT")
+    cursor.execute("ALTER TABLE orders ADD COLUMN fulfillment_attempts INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE orders ADD COLUMN next_attempt_at DATETIME")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_processing ON orders (order_id) WHERE status = 'processing'")
+
+def _migration_order_stats(cursor):
+    # Sifarişin qiyməti sifarişin özündə (əvvəllər yalnız ledger-dəki order_debit yazısında idi)
+    for table in ("orders", "orders_archive"):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN cost_qepik INTEGER")
+        cursor.execute(f"UPDATE {table} SET cost_qepik = (SELECT -amount_qepik FROM ledger WHERE ledger.order_id = {table}.order_id "
+                       f"AND entry_type = 'order_debit')")
+    # Gün (UTC) və xidmət üzrə yığım: sifariş verilməsi, tamamlanması və qaytarılması ilə eyni tranzaksiyada yenilənir
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_stats_daily (
+            day TEXT NOT NULL, -- YYYY-MM-DD
+            service_type TEXT NOT NULL,
+            placed_count INTEGER NOT NULL DEFAULT 0,
+            placed_quantity REAL NOT NULL DEFAULT 0,
+            placed_revenue_qepik INTEGER NOT NULL DEFAULT 0,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            completed_quantity REAL NOT NULL DEFAULT 0,
+            completed_revenue_qepik INTEGER NOT NULL DEFAULT 0,
+            refunded_count INTEGER NOT NULL DEFAULT 0,
+            refunded_quantity REAL NOT NULL DEFAULT 0,
+            refunded_revenue_qepik INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, service_type)
+        ) WITHOUT ROWID
+    """)
+    # Köhnə sifarişlərin tamamlanma/qaytarılma günü məlum deyil — onlar sifarişin verildiyi günə yazılır
+    cursor.execute("""
+        INSERT INTO order_stats_daily
+        SELECT date(timestamp), service_type,
+               COUNT(*), SUM(amount), SUM(COALESCE(cost_qepik, 0)),
+               SUM(status = 'completed'), SUM(IIF(status = 'completed', amount, 0)), SUM(IIF(status = 'completed', COALESCE(cost_qepik, 0), 0)),
+               SUM(status IN ('refunded', 'failed')), SUM(IIF(status IN ('refunded', 'failed'), amount, 0)),
+               SUM(IIF(status IN ('refunded', 'failed'), COALESCE(cost_qepik, 0), 0))
+        FROM (SELECT timestamp, service_type, amount, cost_qepik, status FROM orders
+              UNION ALL SELECT timestamp, service_type, amount, cost_qepik, status FROM orders_archive)
+        WHERE service_type IS NOT NULL
+        GROUP BY date(timestamp), service_type
+    """)
+
+def _migration_register_known_users(cursor):
+    # users sətri əvvəllər yalnız balans dəyişəndə yaranırdı; botla əlaqəsi olmuş hər kəs yayımı almalıdır
+    cursor.execute("""
+        INSERT OR IGNORE INTO users (user_id)
+        SELECT user_id FROM admin_messages WHERE user_id IS NOT NULL
+        UNION SELECT user_id FROM receipts
+        UNION SELECT key FROM conversation_state WHERE namespace IN ('user_states', 'order_drafts')
+    """)
+
+MIGRATIONS = [
+    _migration_initial_schema,
+    _migration_indexes,
+    _migration_conversation_state,
+    _migration_broadcasts,
+    _migration_ledger,
+    _migration_receipts,
+    _migration_admin_messages_timestamp,
+    _migration_orders_archive,
+    _migration_user_orders_index,
+    _migration_fulfillment,
+    _migration_order_stats,
+    _migration_register_known_users,
+]
+
+@run_in_db_thread
+def init_db():
+    """Hələ tətbiq olunmamış miqrasiyaları ardıcıllıqla icra edir."""
+    conn = get_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if version == len(MIGRATIONS) and auto_vacuum == 2:
+        return # Sxem aktualdır: soyuq başlanğıcda iki PRAGMA-dan başqa heç nə etmirik
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            conn.execute("BEGIN")
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {number}")
+
+    # Silinmiş səhifələrin incremental_vacuum ilə diskə qaytarıla bilməsi üçün.
+    # Mövcud faylda rejimi dəyişmək bir dəfəlik tam VACUUM tələb edir (tranzaksiyadan kənarda).
+    if auto_vacuum != 2:
+        logger.info("Switching database to auto_vacuum=INCREMENTAL (one-time VACUUM)")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+# --- Balans (ledger) ---
+# Məbləğlər verilənlər bazasında qəpiklə (tam ədəd) saxlanılır, funksiyalar isə AZN (float) qəbul edib qaytarır.
+
+def to_qepik(amount):
+    return int(round(amount * 100))
+
+def from_qepik(amount_qepik):
+    return amount_qepik / 100
+
+BALANCE_UPDATE_SQL = ("UPDATE users SET balance_qepik = balance_qepik + ?, entries_since_snapshot = entries_since_snapshot + 1 "
+                      "WHERE user_id = ?")
+
+def _insert_ledger_row(cursor, user_id, amount_qepik, entry_type, order_id=None):
+    cursor.execute("INSERT INTO ledger (user_id, amount_qepik, entry_type, order_id) VALUES (?, ?, ?, ?)",
+                   (user_id, amount_qepik, entry_type, order_id))
+
+def _add_ledger_entry(cursor, user_id, amount_qepik, entry_type, order_id=None):
+    """Ledger-ə yazı əlavə edir və materiallaşdırılmış balansı yeniləyir (çağıranın tranzaksiyasında)."""
+    _insert_ledger_row(cursor, user_id, amount_qepik, entry_type, order_id)
+    cursor.execute(BALANCE_UPDATE_SQL, (amount_qepik, user_id))
+
+def _get_balance_qepik(cursor, user_id):
+    cursor.execute("SELECT balance_qepik FROM users WHERE user_id = ?", (user_id,))
     result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else 0.0
+    return result[0] if result else 0
+
+@run_in_db_thread
+def get_user_balance(user_id):
+    conn = get_connection()
+    return from_qepik(_get_balance_qepik(conn.cursor(), user_id))
+
+@run_in_db_thread
+def update_user_balance(user_id, amount, entry_type="topup"):
+    """Balansı dəyişir (ledger yazısı ilə) və yeni balansı qaytarır."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+        _add_ledger_entry(cursor, user_id, to_qepik(amount), entry_type)
+        return from_qepik(_get_balance_qepik(cursor, user_id))
+
+@run_in_background
+def register_user(user_id):
+    """İstifadəçini users cədvəlinə yazır (artıq varsa heç nə etmir) ki, yayımlar ona da çatsın."""
+    conn = get_connection()
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
 
-def update_user_balance(user_id, amount):
-    conn = sqlite3.connect(DATABASE_NAME)
+def _chunks(items, size=500):
+    # SQLite-ın parametr limitinə düşməmək üçün IN (...) siyahıları hissələrə bölünür
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+@run_in_db_thread
+def bulk_update_balances(entries, entry_type="topup"):
+    """[(user_id, amount), ...] siyahısını bir tranzaksiyada tətbiq edir.
+
+    {user_id: yeni_balans} qaytarır.
+    """
+    rows = [(user_id, to_qepik(amount)) for user_id, amount in entries]
+    user_ids = sorted({user_id for user_id, _ in rows})
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany("INSERT OR IGNORE INTO users (user_id) VALUES (?)", [(user_id,) for user_id in user_ids])
+        cursor.executemany("INSERT INTO ledger (user_id, amount_qepik, entry_type) VALUES (?, ?, ?)",
+                           [(user_id, amount_qepik, entry_type) for user_id, amount_qepik in rows])
+        cursor.executemany(BALANCE_UPDATE_SQL, [(amount_qepik, user_id) for user_id, amount_qepik in rows])
+        balances = {}
+        for chunk in _chunks(user_ids):
+            cursor.execute(f"SELECT user_id, balance_qepik FROM users WHERE user_id IN ({','.join('?' * len(chunk))})", chunk)
+            balances.update((user_id, from_qepik(balance_qepik)) for user_id, balance_qepik in cursor.fetchall())
+        return balances
+
+@run_in_db_thread
+def refund_order(order_id, status="refunded", from_status=None):
+    """Sifarişin çıxılmış məbləğini geri qaytarır və statusunu dəyişir.
+
+    (user_id, qaytarılan_məbləğ, yeni_balans) qaytarır; sifarişdə çıxılma yoxdursa və ya artıq qaytarılıbsa None.
+    from_status verildikdə yalnız sifariş hələ həmin statusdadırsa qaytarılır (məs. admin arada /done etməyibsə).
+    Arxivə köçürülmüş sifarişdə arxiv sətrinin statusu və statistikası eyni tranzaksiyada yenilənir.
+    """
+    conn = get_connection()
+    with conn:
+        # Legacy tranzaksiya rejimində SELECT tranzaksiya açmır: yazma kilidi oxumadan əvvəl alınır ki,
+        # başqa worker prosesi status yoxlaması ilə yazı arasında sifarişi dəyişə bilməsin.
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        table = None
+        for candidate in ("orders", "orders_archive"):
+            cursor.execute(f"SELECT status FROM {candidate} WHERE order_id = ?", (order_id,))
+            row = cursor.fetchone()
+            if row is not None:
+                table, current_status = candidate, row[0]
+                break
+        if table is None or (from_status is not None and current_status != from_status):
+            return None
+        cursor.execute("SELECT entry_type, user_id, amount_qepik FROM ledger WHERE order_id = ?", (order_id,))
+        entries = cursor.fetchall()
+        debit = next((entry for entry in entries if entry[0] == "order_debit"), None)
+        if debit is None or any(entry[0] == "refund" for entry in entries):
+            return None
+        _, user_id, amount_qepik = debit
+        _add_ledger_entry(cursor, user_id, -amount_qepik, "refund", order_id)
+        cursor.execute(f"UPDATE {table} SET status = ? WHERE order_id = ?", (status, order_id))
+        _record_order_stats(cursor, "refunded", [order_id], table)
+        return user_id, from_qepik(-amount_qepik), from_qepik(_get_balance_qepik(cursor, user_id))
+
+# --- Ödəniş çekləri ---
+@run_in_db_thread
+def add_receipt(user_id, file_id):
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO receipts (user_id, file_id) VALUES (?, ?)", (user_id, file_id))
+        return cursor.lastrowid
+
+@run_in_db_thread
+def approve_receipt(receipt_id, amount):
+    """Çeki bağlayır və məbləği balansa yazır (bir tranzaksiyada).
+
+    (user_id, yeni_balans) qaytarır; çek tapılmadısa və ya artıq bağlanıbsa None.
+    """
+    amount_qepik = to_qepik(amount)
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE receipts SET status = 'approved', amount_qepik = ?, resolved_at = CURRENT_TIMESTAMP "
+                       "WHERE receipt_id = ? AND status = 'pending' RETURNING user_id", (amount_qepik, receipt_id))
+        result = cursor.fetchone()
+        if result is None:
+            return None
+        user_id = result[0]
+        cursor.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+        _add_ledger_entry(cursor, user_id, amount_qepik, "topup")
+        return user_id, from_qepik(_get_balance_qepik(cursor, user_id))
+
+@run_in_db_thread
+def reject_receipt(receipt_id):
+    """Çeki rədd edir; user_id, çek artıq bağlanıbsa None qaytarır."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE receipts SET status = 'rejected', resolved_at = CURRENT_TIMESTAMP "
+                       "WHERE receipt_id = ? AND status = 'pending' RETURNING user_id", (receipt_id,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+@run_in_db_thread
+def get_pending_receipts(limit):
+    """Ən köhnə gözləyən çekləri (receipt_id, user_id, file_id, created_at) və ümumi sayını qaytarır."""
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, 0.0)", (user_id,))
-    cursor.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, user_id))
-    conn.commit()
-    conn.close()
+    cursor.execute("SELECT receipt_id, user_id, file_id, created_at FROM receipts WHERE status = 'pending' "
+                   "ORDER BY receipt_id LIMIT ?", (limit,))
+    receipts = cursor.fetchall()
+    cursor.execute("SELECT COUNT(*) FROM receipts WHERE status = 'pending'")
+    return receipts, cursor.fetchone()[0]
+
+@run_in_db_thread
+def snapshot_balances(min_entries):
+    """Son snapshot-dan bəri ən azı min_entries yazısı olan istifadəçilər üçün balans snapshot-u yazır.
+
+    Snapshot users.balance_qepik-dən yox, ledger-dən hesablanır: əvvəlki snapshot + ondan sonrakı yazıların cəmi.
+    Beləliklə materiallaşdırılmış balansdakı sürüşmə snapshot-a keçmir, əksinə log-a yazılır.
+    Yoxlama (reconcile_balance) yalnız son snapshot-dan sonrakı yazıları oxuyur. Yazılmış snapshot sayını qaytarır.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE") # oxunan balanslar yazılana qədər dəyişməsin (bax refund_order)
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id, balance_qepik FROM users WHERE entries_since_snapshot >= ? AND entries_since_snapshot > 0",
+                       (min_entries,))
+        users = cursor.fetchall()
+        drifted = []
+        for user_id, balance_qepik in users:
+            entry_id, computed = _ledger_balance_qepik(cursor, user_id)
+            cursor.execute("INSERT OR IGNORE INTO balance_snapshots (user_id, entry_id, balance_qepik) VALUES (?, ?, ?)",
+                           (user_id, entry_id, computed))
+            if computed != balance_qepik:
+                drifted.append(user_id)
+        cursor.executemany("UPDATE users SET entries_since_snapshot = 0 WHERE user_id = ?", [(user_id,) for user_id, _ in users])
+    if drifted:
+        logger.error(f"Materialized balance differs from the ledger for {len(drifted)} user(s): "
+                     f"{', '.join(map(str, drifted[:20]))}")
+    return len(users)
+
+def _ledger_balance_qepik(cursor, user_id):
+    """(son ledger yazısının ID-si, ledger-ə görə balans): son snapshot + ondan sonrakı yazıların cəmi."""
+    cursor.execute("SELECT entry_id, balance_qepik FROM balance_snapshots WHERE user_id = ? ORDER BY entry_id DESC LIMIT 1",
+                   (user_id,))
+    entry_id, balance_qepik = cursor.fetchone() or (0, 0)
+    cursor.execute("SELECT MAX(entry_id), COALESCE(SUM(amount_qepik), 0) FROM ledger WHERE user_id = ? AND entry_id > ?",
+                   (user_id, entry_id))
+    last_entry_id, delta = cursor.fetchone()
+    return last_entry_id or entry_id, balance_qepik + delta
 
-def get_service_price(service_name):
-    conn = sqlite3.connect(DATABASE_NAME)
+@run_in_db_thread
+def reconcile_balance(user_id):
+    """(materiallaşdırılmış_balans, ledger-dən_hesablanan_balans) qaytarır; ikisi bərabər olmalıdır."""
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT price_per_k FROM services WHERE service_name = ?", (service_name,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else None
+    _, computed = _ledger_balance_qepik(cursor, user_id)
+    return from_qepik(_get_balance_qepik(cursor, user_id)), from_qepik(computed)
 
+@run_in_db_thread
 def get_all_services():
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT service_name, price_per_k FROM services")
     results = cursor.fetchall()
-    conn.close()
     return results
 
+@run_in_db_thread
 def update_service_price(service_name, new_price):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE services SET price_per_k = ? WHERE service_name = ?", (new_price, service_name))
     conn.commit()
-    conn.close()
 
-def add_order(user_id, service_type, amount, link):
-    conn = sqlite3.connect(DATABASE_NAME)
+ORDER_STATS_EVENTS = ("placed", "completed", "refunded")
+
+def _record_order_stats(cursor, event, order_ids, table="orders"):
+    """Sifarişləri bu günün (UTC) order_stats_daily sətirlərinə event (ORDER_STATS_EVENTS-dən biri) kimi əlavə edir.
+
+    Çağıranın tranzaksiyasında işləyir ki, yığım sifarişin özü ilə həmişə uyğun qalsın.
+    Sifarişlər table cədvəlindən (orders və ya orders_archive) oxunur.
+    """
+    columns = [f"{event}_count", f"{event}_quantity", f"{event}_revenue_qepik"]
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in columns)
+    for chunk in _chunks(list(order_ids)):
+        cursor.execute(f"INSERT INTO order_stats_daily (day, service_type, {', '.join(columns)}) "
+                       f"SELECT date('now'), service_type, COUNT(*), SUM(amount), SUM(COALESCE(cost_qepik, 0)) FROM {table} "
+                       f"WHERE order_id IN ({','.join('?' * len(chunk))}) GROUP BY service_type "
+                       f"ON CONFLICT (day, service_type) DO UPDATE SET {updates}", chunk)
+
+@run_in_db_thread
+def place_order(user_id, service_type, amount, link, total_cost):
+    """Balansdan çıxılma və sifarişin yazılması bir tranzaksiyada.
+
+    (order_id, yeni_balans) qaytarır; balans kifayət etmirsə (None, cari_balans).
+    """
+    cost_qepik = to_qepik(total_cost)
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(BALANCE_UPDATE_SQL + " AND balance_qepik >= ?", (-cost_qepik, user_id, cost_qepik))
+        debited = cursor.rowcount == 1
+        if debited:
+            cursor.execute("INSERT INTO orders (user_id, service_type, amount, link, cost_qepik) VALUES (?, ?, ?, ?, ?)",
+                           (user_id, service_type, amount, link, cost_qepik))
+            order_id = cursor.lastrowid
+            _insert_ledger_row(cursor, user_id, -cost_qepik, "order_debit", order_id)
+            _record_order_stats(cursor, "placed", [order_id])
+        balance = from_qepik(_get_balance_qepik(cursor, user_id))
+    return (order_id, balance) if debited else (None, balance)
+
+@run_in_db_thread
+def complete_orders(order_ids):
+    """Hələ açıq ('pending', 'processing') sifarişləri bir tranzaksiyada 'completed' edir.
+
+    (tamamlanan [(order_id, user_id), ...], artıq bağlanmış [(order_id, status), ...], tapılmayan ID-lər) qaytarır.
+    Refund olunmuş və ya failed sifariş tamamlanmır — o da "artıq bağlanmış" sayılır.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        completed = []
+        for chunk in _chunks(list(order_ids)):
+            cursor.execute(f"UPDATE orders SET status = 'completed' WHERE status IN ('pending', 'processing') "
+                           f"AND order_id IN ({','.join('?' * len(chunk))}) RETURNING order_id, user_id", chunk)
+            completed.extend(cursor.fetchall())
+        completed.sort()
+        _record_order_stats(cursor, "completed", [order_id for order_id, _ in completed])
+
+        completed_ids = {order_id for order_id, _ in completed}
+        closed = {}
+        for table in ("orders", "orders_archive"):
+            for chunk in _chunks([order_id for order_id in order_ids if order_id not in completed_ids and order_id not in closed]):
+                cursor.execute(f"SELECT order_id, status FROM {table} WHERE order_id IN ({','.join('?' * len(chunk))})", chunk)
+                closed.update(cursor.fetchall())
+    already_closed = sorted(closed.items())
+    missing = [order_id for order_id in order_ids if order_id not in completed_ids and order_id not in closed]
+    return completed, already_closed, missing
+
+# --- Avtomatik icra (fulfillment.py) ---
+@run_in_db_thread
+def claim_orders_for_fulfillment(service_types, limit):
+    """Növbəsi çatmış pending sifarişləri 'processing' edir və qaytarır.
+
+    [(order_id, user_id, service_type, amount, link, cəhd_sayı), ...]; cəhd sayına bu cəhd də daxildir.
+    """
+    if not service_types:
+        return []
+    placeholders = ",".join("?" * len(service_types))
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE orders SET status = 'processing', fulfillment_attempts = fulfillment_attempts + 1 "
+                       f"WHERE order_id IN (SELECT order_id FROM orders WHERE status = 'pending' "
+                       f"AND service_type IN ({placeholders}) AND (next_attempt_at IS NULL OR next_attempt_at <= datetime('now')) "
+                       f"ORDER BY timestamp, order_id LIMIT ?) "
+                       f"RETURNING order_id, user_id, service_type, amount, link, fulfillment_attempts",
+                       (*service_types, limit))
+        return sorted(cursor.fetchall())
+
+@run_in_db_thread
+def set_provider_order_ids(entries):
+    """[(order_id, provider_order_id), ...] — provayderin qəbul etdiyi sifarişlər."""
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE orders SET provider_order_id = ? WHERE order_id = ?",
+                         [(provider_order_id, order_id) for order_id, provider_order_id in entries])
+
+@run_in_db_thread
+def retry_orders_later(entries):
+    """[(order_id, gecikmə_saniyə), ...] — göndərilə bilməyən sifarişləri gecikmə ilə pending-ə qaytarır."""
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE orders SET status = 'pending', next_attempt_at = datetime('now', ?) "
+                         "WHERE order_id = ? AND status = 'processing'",
+                         [(f"+{int(delay)} seconds", order_id) for order_id, delay in entries])
+
+@run_in_db_thread
+def get_processing_orders(after_order_id, limit):
+    """Provayderə göndərilmiş, hələ bitməmiş sifarişlər: [(order_id, provider_order_id), ...] (order_id kursoru ilə)."""
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO orders (user_id, service_type, amount, link) VALUES (?, ?, ?, ?)",
-                   (user_id, service_type, amount, link))
-    order_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return order_id
+    cursor.execute("SELECT order_id, provider_order_id FROM orders WHERE status = 'processing' AND order_id > ? "
+                   "AND provider_order_id IS NOT NULL ORDER BY order_id LIMIT ?", (after_order_id, limit))
+    return cursor.fetchall()
 
-def update_order_status(order_id, status):
-    conn = sqlite3.connect(DATABASE_NAME)
+@run_in_db_thread
+def get_unsubmitted_processing_orders():
+    """'processing' olub provayder ID-si olmayan sifarişlər (göndəriş zamanı proses dayanıb)."""
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("UPDATE orders SET status = ? WHERE order_id = ?", (status, order_id))
-    conn.commit()
-    conn.close()
+    cursor.execute("SELECT order_id FROM orders WHERE status = 'processing' AND provider_order_id IS NULL ORDER BY order_id")
+    return [row[0] for row in cursor.fetchall()]
+
+@run_in_db_thread
+def finish_processing_orders(order_ids):
+    """Hələ 'processing' olan sifarişləri 'completed' edir; [(order_id, user_id), ...] qaytarır."""
+    conn = get_connection()
+    completed = []
+    with conn:
+        cursor = conn.cursor()
+        for chunk in _chunks(list(order_ids)):
+            cursor.execute(f"UPDATE orders SET status = 'completed' WHERE status = 'processing' "
+                           f"AND order_id IN ({','.join('?' * len(chunk))}) RETURNING order_id, user_id", chunk)
+            completed.extend(cursor.fetchall())
+        _record_order_stats(cursor, "completed", [order_id for order_id, _ in completed])
+    return sorted(completed)
 
+@run_in_db_thread
+def finish_partial_order(order_id, remains):
+    """Provayderin qismən icra etdiyi 'processing' sifarişi tamamlayır və icra olunmayan hissəni qaytarır.
+
+    Qaytarılan məbləğ çıxılmış məbləğin remains / amount payıdır (refund_order kimi "refund" yazısı, sonrakı
+    tam qaytarılma buna görə rədd olunur). (user_id, qaytarılan_məbləğ, yeni_balans) qaytarır; sifariş artıq
+    'processing' deyilsə None.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE orders SET status = 'completed' WHERE order_id = ? AND status = 'processing' "
+                       "RETURNING user_id, service_type, amount", (order_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        user_id, service_type, amount = row
+        _record_order_stats(cursor, "completed", [order_id])
+
+        cursor.execute("SELECT -amount_qepik FROM ledger WHERE order_id = ? AND entry_type = 'order_debit'", (order_id,))
+        debit = cursor.fetchone()
+        remains = min(max(remains, 0), amount)
+        refund_qepik = round(debit[0] * remains / amount) if debit and amount else 0
+        if refund_qepik > 0:
+            _add_ledger_entry(cursor, user_id, refund_qepik, "refund", order_id)
+            cursor.execute("INSERT INTO order_stats_daily (day, service_type, refunded_count, refunded_quantity, refunded_revenue_qepik) "
+                           "VALUES (date('now'), ?, 1, ?, ?) ON CONFLICT (day, service_type) DO UPDATE SET "
+                           "refunded_count = refunded_count + 1, refunded_quantity = refunded_quantity + excluded.refunded_quantity, "
+                           "refunded_revenue_qepik = refunded_revenue_qepik + excluded.refunded_revenue_qepik",
+                           (service_type, remains, refund_qepik))
+        return user_id, from_qepik(refund_qepik), from_qepik(_get_balance_qepik(cursor, user_id))
+
+@run_in_db_thread
 def get_order_details(order_id):
-    conn = sqlite3.connect(DATABASE_NAME)
+    """Sifarişi əvvəl orders, tapılmadıqda orders_archive cədvəlində axtarır."""
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT user_id, service_type, amount, link, status, timestamp FROM orders WHERE order_id = ?", (order_id,))
     result = cursor.fetchone()
-    conn.close()
+    if result is None:
+        cursor.execute("SELECT user_id, service_type, amount, link, status, timestamp FROM orders_archive WHERE order_id = ?",
+                       (order_id,))
+        result = cursor.fetchone()
     return result
 
-def get_all_orders():
-    conn = sqlite3.connect(DATABASE_NAME)
+@run_in_db_thread
+def get_orders_page(limit, before=None, after=None, status=None, service_type=None, user_id=None, archived=False):
+    """Sifarişləri (timestamp, order_id) kursoru ilə səhifələyir.
+
+    before — bu (timestamp, order_id) cütündən köhnələr, after — yeniləri. Kursor sifarişin özünə müraciət
+    etmir, ona görə sifariş arada arxivə köçsə də səhifələmə davam edir. Sətirlər həmişə yenidən
+    köhnəyə sıralanır. (orders, has_more) qaytarır; has_more kursor istiqamətində daha sətir olduğunu bildirir.
+    archived=True olduqda orders_archive cədvəli oxunur.
+    """
+    table = "orders_archive" if archived else "orders"
+    conditions = []
+    params = []
+    for column, value in (("status", status), ("service_type", service_type), ("user_id", user_id)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+
+    order_by = "timestamp DESC, order_id DESC"
+    if before is not None:
+        conditions.append("(timestamp, order_id) < (?, ?)")
+        params.extend(before)
+    elif after is not None:
+        conditions.append("(timestamp, order_id) > (?, ?)")
+        params.extend(after)
+        order_by = "timestamp ASC, order_id ASC"
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT order_id, user_id, service_type, amount, link, status, timestamp FROM orders ORDER BY timestamp DESC")
+    cursor.execute(f"SELECT order_id, user_id, service_type, amount, link, status, timestamp FROM {table} "
+                   f"{where} ORDER BY {order_by} LIMIT ?", (*params, limit + 1))
     results = cursor.fetchall()
-    conn.close()
-    return results
+    has_more = len(results) > limit
+    results = results[:limit]
+    if after is not None:
+        results.reverse()
+    return results, has_more
 
-def save_admin_message_mapping(user_telegram_id, admin_message_telegram_id):
-    conn = sqlite3.connect(DATABASE_NAME)
+@run_in_db_thread
+def get_user_orders_page(user_id, limit, before=None, after=None):
+    """Bir istifadəçinin sifarişlərini (arxiv daxil) order_id kursoru ilə səhifələyir.
+
+    Hər cədvəldən (user_id, order_id) indeksi ilə ən çox limit + 1 sətir oxunur, ona görə səhifə
+    ümumi sifariş sayından asılı olmayaraq eyni vaxtda qayıdır. Sətirlər yenidən köhnəyə sıralanır:
+    (order_id, service_type, amount, link, status, timestamp, cost). (orders, has_more) qaytarır.
+    """
+    condition, order_by, cursor_params = "", "DESC", ()
+    if before is not None:
+        condition, cursor_params = "AND order_id < ?", (before,)
+    elif after is not None:
+        condition, order_by, cursor_params = "AND order_id > ?", "ASC", (after,)
+
+    page = " UNION ALL ".join(
+        f"SELECT * FROM (SELECT order_id, service_type, amount, link, status, timestamp, cost_qepik FROM {table} "
+        f"WHERE user_id = ? {condition} ORDER BY order_id {order_by} LIMIT ?)"
+        for table in ("orders", "orders_archive")
+    )
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO admin_messages (user_id, admin_message_id) VALUES (?, ?)",
-                   (user_telegram_id, admin_message_telegram_id))
-    conn.commit()
-    conn.close()
+    cursor.execute(f"SELECT * FROM ({page}) ORDER BY order_id {order_by} LIMIT ?",
+                   (user_id, *cursor_params, limit + 1) * 2 + (limit + 1,))
+    results = [(*row[:6], from_qepik(row[6]) if row[6] is not None else None) for row in cursor.fetchall()]
+    has_more = len(results) > limit
+    results = results[:limit]
+    if after is not None:
+        results.reverse()
+    return results, has_more
+
+@run_in_db_thread
+def get_order_stats(since, until):
+    """order_stats_daily-dən since..until (YYYY-MM-DD, hər ikisi daxil) günləri üzrə xidmət başına cəmlər.
+
+    [(service_type, verilən_say, verilən_miqdar, satış, tamamlanan_say, tamamlanan_məbləğ, qaytarılan_say,
+    qaytarılan_məbləğ), ...] — satışa görə azalan sıra ilə; məbləğlər AZN.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT service_type, SUM(placed_count), SUM(placed_quantity), SUM(placed_revenue_qepik), "
+                   "SUM(completed_count), SUM(completed_revenue_qepik), SUM(refunded_count), SUM(refunded_revenue_qepik) "
+                   "FROM order_stats_daily WHERE day BETWEEN ? AND ? GROUP BY service_type ORDER BY SUM(placed_revenue_qepik) DESC",
+                   (since, until))
+    return [(service_type, placed, quantity, from_qepik(revenue), completed, from_qepik(completed_revenue),
+             refunded, from_qepik(refunded_revenue))
+            for service_type, placed, quantity, revenue, completed, completed_revenue, refunded, refunded_revenue
+            in cursor.fetchall()]
+
+# --- Eksport ---
+# {cədvəl: (sorğu, tarix sütunu, status sütunu)}; tarix/status filtri olmayan cədvəllərdə None
+EXPORT_QUERIES = {
+    "orders": ("SELECT order_id, user_id, service_type, amount, cost_qepik / 100.0 AS cost, link, status, timestamp FROM orders",
+               "timestamp", "status"),
+    "orders_archive": ("SELECT order_id, user_id, service_type, amount, cost_qepik / 100.0 AS cost, link, status, timestamp, archived_at "
+                       "FROM orders_archive", "timestamp", "status"),
+    "users": ("SELECT user_id, balance_qepik / 100.0 AS balance FROM users", None, None),
+    "services": ("SELECT service_name, price_per_k FROM services", None, None),
+}
+
+def iter_export_rows(table, since=None, until=None, status=None, batch_size=1000):
+    """Cədvəli fetchmany ilə partiyalarla oxuyan generator: əvvəl sütun adlarını, sonra sətir partiyalarını verir.
+
+    Ayrıca read-only bağlantı açır (WAL-da oxucu yazıları bloklamır), ona görə DB thread-ini tutmur;
+    generator bütünlüklə bir thread-də istehlak olunmalıdır. since/until 'YYYY-MM-DD' (until daxil).
+    """
+    query, date_column, status_column = EXPORT_QUERIES[table]
+    conditions = []
+    params = []
+    if (since or until) and date_column is None:
+        raise ValueError(f"{table} cədvəli tarixə görə filtrlənmir")
+    if status and status_column is None:
+        raise ValueError(f"{table} cədvəli statusa görə filtrlənmir")
+    if since:
+        conditions.append(f"{date_column} >= ?")
+        params.append(since)
+    if until:
+        conditions.append(f"{date_column} < date(?, '+1 day')")
+        params.append(until)
+    if status:
+        conditions.append(f"{status_column} = ?")
+        params.append(status)
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+
+    conn = sqlite3.connect(f"file:{DATABASE_NAME}?mode=ro", uri=True)
+    try:
+        conn.execute("PRAGMA busy_timeout=5000")
+        cursor = conn.execute(query + " ORDER BY 1", params)
+        yield [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+ARCHIVED_ORDER_STATUSES = ("completed", "refunded", "failed")
+
+@run_in_db_thread
+def archive_orders(max_age_days, batch_size=500):
+    """max_age_days gündən köhnə bağlanmış sifarişləri hissə-hissə orders_archive-ə köçürür.
+
+    Hər hissə ayrıca tranzaksiyadır (köçürmə və silmə birlikdə). Köçürülən sayı qaytarır.
+    """
+    conn = get_connection()
+    status_placeholders = ",".join("?" * len(ARCHIVED_ORDER_STATUSES))
+    archived = 0
+    while True:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE") # seçim də köçürmə ilə eyni tranzaksiyada olsun (bax refund_order)
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT order_id FROM orders WHERE status IN ({status_placeholders}) "
+                           f"AND timestamp < datetime('now', ?) LIMIT ?",
+                           (*ARCHIVED_ORDER_STATUSES, f"-{max_age_days} days", batch_size))
+            order_ids = [(row[0],) for row in cursor.fetchall()]
+            cursor.executemany("INSERT OR REPLACE INTO orders_archive (order_id, user_id, service_type, amount, link, status, timestamp, cost_qepik) "
+                               "SELECT order_id, user_id, service_type, amount, link, status, timestamp, cost_qepik FROM orders WHERE order_id = ?",
+                               order_ids)
+            cursor.executemany("DELETE FROM orders WHERE order_id = ?", order_ids)
+        archived += len(order_ids)
+        if len(order_ids) < batch_size:
+            return archived
 
+@run_in_db_thread
+def incremental_vacuum():
+    """Boş səhifələri fayldan azad edir; azad olunan səhifə sayını qaytarır."""
+    conn = get_connection()
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if free_pages:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    return free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+@run_in_background
+def save_admin_message_mapping(user_telegram_id, admin_message_telegram_id):
+    conn = get_connection()
+    with conn:
+        conn.execute("INSERT INTO admin_messages (user_id, admin_message_id) VALUES (?, ?)",
+                     (user_telegram_id, admin_message_telegram_id))
+
+@run_in_db_thread
 def get_user_id_from_admin_message_id(admin_message_telegram_id):
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT user_id FROM admin_messages WHERE admin_message_id = ?", (admin_message_telegram_id,))
     result = cursor.fetchone()
-    conn.close()
     return result[0] if result else None
 
+@run_in_db_thread
+def prune_admin_messages(max_age_days, batch_size=1000):
+    """max_age_days gündən köhnə admin_messages sətirlərini hissə-hissə silir, silinən sayı qaytarır.
+
+    Hər hissə ayrıca tranzaksiyadır ki, yazı kilidi uzun müddət tutulmasın.
+    """
+    conn = get_connection()
+    deleted = 0
+    while True:
+        with conn:
+            cursor = conn.execute("DELETE FROM admin_messages WHERE message_id IN (SELECT message_id FROM admin_messages "
+                                  "WHERE timestamp < datetime('now', ?) LIMIT ?)", (f"-{max_age_days} days", batch_size))
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
+
+
+@run_in_db_thread
+def load_states(namespace, now, limit):
+    """Vaxtı keçməmiş vəziyyətləri (key, value, expires_at) köhnədən yeniyə qaytarır, vaxtı keçənləri silir."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM conversation_state WHERE namespace = ? AND expires_at <= ?", (namespace, now))
+        cursor.execute("SELECT key, value, expires_at FROM (SELECT key, value, expires_at FROM conversation_state "
+                       "WHERE namespace = ? ORDER BY expires_at DESC LIMIT ?) ORDER BY expires_at ASC",
+                       (namespace, limit))
+        return cursor.fetchall()
+
+@run_in_background
+def save_state(namespace, key, value, expires_at):
+    conn = get_connection()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO conversation_state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                     (namespace, key, value, expires_at))
+
+@run_in_background
+def delete_state(namespace, key):
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM conversation_state WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+@run_in_db_thread
+def get_user_ids_after(last_user_id, limit):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (last_user_id, limit))
+    return [row[0] for row in cursor.fetchall()]
+
+@run_in_db_thread
+def create_broadcast(text):
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO broadcasts (text) VALUES (?)", (text,))
+        return cursor.lastrowid
+
+@run_in_db_thread
+def update_broadcast_progress(broadcast_id, last_user_id, sent, failed):
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE broadcasts SET last_user_id = ?, sent = ?, failed = ? WHERE broadcast_id = ?",
+                     (last_user_id, sent, failed, broadcast_id))
+
+@run_in_db_thread
+def finish_broadcast(broadcast_id):
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE broadcasts SET status = 'finished', finished_at = CURRENT_TIMESTAMP WHERE broadcast_id = ?",
+                     (broadcast_id,))
+
+@run_in_db_thread
+def get_running_broadcasts():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT broadcast_id, text, last_user_id, sent, failed FROM broadcasts WHERE status = 'running'")
+    return cursor.fetchall()
+
 
 if __name__ == "__main__":
-    init_db()
+    asyncio.run(init_db())
     print("Database initialized successfully.")
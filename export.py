@@ -0,0 +1,32 @@
+import csv
+import gzip
+import json
+
+import database
+
+# Admin /export əmri üçün gzip ilə sıxılmış CSV / JSON Lines yazıcısı
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+def write_export(path, table, export_format="csv", **filters):
+    """Cədvəli partiyalarla oxuyub path faylına gzip ilə yazır və yazılmış sətir sayını qaytarır.
+
+    Yaddaş istifadəsi cədvəlin ölçüsündən asılı deyil (bir partiya + gzip buferi).
+    Sinxrondur — event loop-dan asyncio.to_thread ilə çağırılmalıdır.
+    """
+    rows = database.iter_export_rows(table, **filters)
+    columns = next(rows)
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6) as output:
+        if export_format == "csv":
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            for batch in rows:
+                writer.writerows(batch)
+                count += len(batch)
+        else:
+            for batch in rows:
+                output.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in batch)
+                count += len(batch)
+    return count
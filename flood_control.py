@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+
+# check() nəticələri
+ALLOWED = "allowed"
+DROPPED = "dropped"
+MUTED = "muted" # bu update ilə istifadəçi susduruldu (update də atılır)
+
+
+class _UserState:
+    __slots__ = ("buckets", "strikes", "strikes_since", "muted_until")
+
+    def __init__(self, now):
+        self.buckets = {} # {növ: (tokenlər, son yenilənmə)}
+        self.strikes = 0
+        self.strikes_since = now
+        self.muted_until = 0.0
+
+
+class FloodControl:
+    """İstifadəçi başına, update növünə görə ayrıca token bucket-lər.
+
+    limits: {növ: (saniyədə token, maksimum token)}. Limiti aşan update atılır və "xəta" sayılır;
+    strike_window saniyə ərzində mute_after xəta yığan istifadəçi mute_seconds müddətinə susdurulur.
+    Hər şey yaddaşda və sinxrondur — verilənlər bazasına müraciət yoxdur. Ən çox max_users istifadəçi
+    izlənir; ən köhnə aktivliyi olanlar silinir.
+    """
+
+    def __init__(self, limits, mute_after, strike_window, mute_seconds, max_users):
+        self.limits = limits
+        self.mute_after = mute_after
+        self.strike_window = strike_window
+        self.mute_seconds = mute_seconds
+        self.max_users = max_users
+        self._users = OrderedDict() # {user_id: _UserState}, sonuncu aktiv olan sonda
+
+    def __len__(self):
+        return len(self._users)
+
+    def check(self, user_id, kind):
+        """Update-in emal olunub-olunmayacağını qaytarır: ALLOWED, DROPPED və ya MUTED."""
+        limit = self.limits.get(kind)
+        if limit is None:
+            return ALLOWED
+        now = time.monotonic()
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState(now)
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+
+        if state.muted_until > now:
+            return DROPPED
+
+        rate, capacity = limit
+        tokens, updated = state.buckets.get(kind, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            state.buckets[kind] = (tokens - 1, now)
+            return ALLOWED
+        state.buckets[kind] = (tokens, now)
+
+        if now - state.strikes_since > self.strike_window:
+            state.strikes = 0
+            state.strikes_since = now
+        state.strikes += 1
+        if self.mute_after and state.strikes >= self.mute_after:
+            state.muted_until = now + self.mute_seconds
+            state.strikes = 0
+            state.strikes_since = now
+            return MUTED
+        return DROPPED
+
+    def muted_count(self):
+        now = time.monotonic()
+        return sum(1 for state in self._users.values() if state.muted_until > now)
@@ -0,0 +1,253 @@
+"""Sifarişlərin provayderə (SMM panel API) avtomatik göndərilməsi.
+
+Sifarişin yolu: pending -> processing (provayderə göndərildi) -> completed və ya failed (məbləğ qaytarılır).
+Qismən icra olunmuş sifariş (provayderdə "partial") completed olur, icra olunmayan hissənin məbləği qaytarılır.
+Provayder icra olunmayan miqdarı (remains) bildirməyibsə sifariş 'processing' qalır və adminə göstərilir.
+Göndərilə bilməyən sifariş (şəbəkə xətası, 5xx, 429) gecikmə ilə yenidən pending olur; gecikmə hər cəhddə
+ikiqat artır, max_attempts cəhddən sonra sifariş failed olur. Provayder sifarişi rədd edərsə dərhal failed olur.
+Admin /done ilə hələ açıq (pending, processing) sifarişi əl ilə tamamlaya bilər; worker yalnız hələ 'processing' olanların statusunu dəyişir.
+"""
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+
+import httpx
+
+import database
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Provayderin statusu bizim terminlərlə
+IN_PROGRESS = "processing"
+COMPLETED = "completed"
+PARTIAL = "partial" # bir hissəsi icra olunub, qalanı (remains) icra olunmayacaq
+FAILED = "failed"
+
+
+class ProviderError(Exception):
+    """Provayder sifarişi rədd etdi — təkrar cəhd mənasızdır."""
+
+
+class TransientProviderError(Exception):
+    """Müvəqqəti xəta (şəbəkə, 5xx, limit) — sifariş sonra yenidən göndərilir."""
+
+
+class Provider(ABC):
+    """Provayder interfeysi. Yeni provayder submit və get_statuses-i təmin etməlidir (close istəyə bağlıdır).
+
+    Biri əskik olarsa, xəta işləmə zamanı deyil, obyekt yaradılarkən (TypeError) verilir.
+    """
+
+    status_batch_size = 100 # get_statuses-ə bir dəfədə verilən ən çox ID
+
+    @abstractmethod
+    async def submit(self, service_type, amount, link):
+        """Sifarişi göndərir və provayderin sifariş ID-sini (str) qaytarır."""
+
+    @abstractmethod
+    async def get_statuses(self, provider_order_ids):
+        """{provider_order_id: (IN_PROGRESS | COMPLETED | PARTIAL | FAILED, remains)}; cavabda olmayan ID-lər dəyişməz sayılır.
+
+        remains — icra olunmamış miqdar (PARTIAL üçün lazımdır), bilinmirsə None.
+        """
+
+    async def close(self):
+        pass
+
+
+class SmmPanelProvider(Provider):
+    """Geniş yayılmış SMM panel API v2 (POST key, action=add|status).
+
+    services: {bizim service_type: panelin xidmət ID-si}. Bütün sorğular bir httpx.AsyncClient-in
+    bağlantı hovuzundan keçir.
+    """
+
+    # "Partial" — panel sifarişin bir hissəsini yerinə yetirib, "remains" qədərini öz balansımıza qaytarıb
+    STATUSES = {"completed": COMPLETED, "partial": PARTIAL, "canceled": FAILED, "cancelled": FAILED, "refunded": FAILED}
+
+    def __init__(self, api_url, api_key, services, max_connections=10, timeout=20.0):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.services = services
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def _call(self, action, **params):
+        started = time.perf_counter()
+        try:
+            response = await self._client.post(self.api_url, data={"key": self.api_key, "action": action, **params})
+        except httpx.HTTPError as e:
+            raise TransientProviderError(f"{action}: {e!r}") from e
+        finally:
+            metrics.PROVIDER_LATENCY.observe(time.perf_counter() - started, action)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientProviderError(f"{action}: HTTP {response.status_code}")
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise TransientProviderError(f"{action}: invalid JSON (HTTP {response.status_code})") from e
+        if isinstance(data, dict) and "error" in data:
+            raise ProviderError(f"{action}: {data['error']}")
+        return data
+
+    async def submit(self, service_type, amount, link):
+        data = await self._call("add", service=self.services[service_type], link=link, quantity=int(amount))
+        if not isinstance(data, dict) or "order" not in data:
+            raise ProviderError(f"add: unexpected response {data!r}"[:200])
+        return str(data["order"])
+
+    async def get_statuses(self, provider_order_ids):
+        data = await self._call("status", orders=",".join(provider_order_ids))
+        if not isinstance(data, dict):
+            raise TransientProviderError(f"status: unexpected response {data!r}"[:200])
+        statuses = {}
+        for provider_order_id, result in data.items():
+            if isinstance(result, dict) and "status" in result:
+                try:
+                    remains = float(result.get("remains"))
+                except (TypeError, ValueError):
+                    remains = None
+                statuses[provider_order_id] = (self.STATUSES.get(result["status"].lower(), IN_PROGRESS), remains)
+        return statuses
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class FulfillmentWorker:
+    """Dövri işdən (run_once) çağırılır: yeni sifarişləri göndərir və göndərilmişlərin statusunu yoxlayır.
+
+    on_completed([(order_id, user_id), ...]), on_partial([(order_id, user_id, icra_olunmayan, qaytarılan, yeni_balans), ...])
+    və on_failed([(order_id, user_id, qaytarılan, yeni_balans, səbəb), ...]) bildirişlər üçündür; on_needs_review
+    ([(order_id, səbəb), ...]) avtomatik bağlana bilməyən sifarişləri (hər birini bir dəfə) adminə çatdırır. Hər run_once-da ən çox batch_size sifariş göndərilir və poll_batch_size sifariş yoxlanılır;
+    yoxlanılacaq sifariş çoxdursa növbəti çağırışlar qalanlardan davam edir.
+    """
+
+    def __init__(self, provider, service_types, on_completed, on_partial, on_failed, batch_size=50, poll_batch_size=500,
+                 max_attempts=5, retry_delay=30, on_needs_review=None):
+        self.provider = provider
+        self.service_types = sorted(service_types)
+        self.on_completed = on_completed
+        self.on_partial = on_partial
+        self.on_failed = on_failed
+        self.on_needs_review = on_needs_review
+        self._reviewed = set() # adminə artıq göstərilmiş sifarişlər
+        self.batch_size = batch_size
+        self.poll_batch_size = poll_batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._poll_cursor = 0
+
+    async def run_once(self):
+        await self._submit_pending()
+        await self._poll_processing()
+
+    async def _submit_one(self, order):
+        _, _, service_type, amount, link, _ = order
+        try:
+            return order, await self.provider.submit(service_type, amount, link), None
+        except (ProviderError, TransientProviderError) as e:
+            return order, None, e
+
+    async def _submit_pending(self):
+        orders = await database.claim_orders_for_fulfillment(self.service_types, self.batch_size)
+        if not orders:
+            return
+        submitted, retries, failed = [], [], []
+        for order, provider_order_id, error in await asyncio.gather(*(self._submit_one(order) for order in orders)):
+            order_id, user_id, _, _, _, attempts = order
+            if error is None:
+                submitted.append((order_id, provider_order_id))
+            elif isinstance(error, TransientProviderError) and attempts < self.max_attempts:
+                retries.append((order_id, self.retry_delay * 2 ** (attempts - 1)))
+                logger.warning(f"Order {order_id} submit attempt {attempts} failed, retrying: {error}")
+            else:
+                failed.append((order_id, user_id, str(error)))
+                logger.error(f"Order {order_id} could not be submitted after {attempts} attempt(s): {error}")
+        if submitted:
+            await database.set_provider_order_ids(submitted)
+            metrics.FULFILLMENT.inc("submitted", amount=len(submitted))
+        if retries:
+            await database.retry_orders_later(retries)
+            metrics.FULFILLMENT.inc("retried", amount=len(retries))
+        await self._fail(failed)
+
+    async def _poll_processing(self):
+        orders = await database.get_processing_orders(self._poll_cursor, self.poll_batch_size)
+        self._poll_cursor = orders[-1][0] if len(orders) == self.poll_batch_size else 0
+        if not orders:
+            return
+        order_ids = {provider_order_id: order_id for order_id, provider_order_id in orders}
+        provider_ids = list(order_ids)
+        batches = [provider_ids[start:start + self.provider.status_batch_size]
+                   for start in range(0, len(provider_ids), self.provider.status_batch_size)]
+        completed, partial, failed, needs_review = [], [], [], []
+        for result in await asyncio.gather(*(self.provider.get_statuses(batch) for batch in batches), return_exceptions=True):
+            if isinstance(result, Exception):
+                # Növbəti çağırışda yenidən soruşulacaq
+                logger.warning(f"Order status check failed: {result!r}")
+                continue
+            for provider_order_id, (status, remains) in result.items():
+                order_id = order_ids.get(provider_order_id)
+                if order_id is None:
+                    continue
+                if status == COMPLETED or (status == PARTIAL and remains == 0):
+                    completed.append(order_id)
+                elif status == PARTIAL and remains is None:
+                    # Nə qədərinin qaytarılacağı bilinmir: tam tamamlamaq istifadəçini aldadar
+                    if order_id not in self._reviewed:
+                        self._reviewed.add(order_id)
+                        needs_review.append((order_id, "provayder qismən icra etdi, icra olunmayan miqdar bilinmir"))
+                        logger.warning(f"Order {order_id} is partial with unknown remains; left in 'processing' for review")
+                elif status == PARTIAL:
+                    partial.append((order_id, remains))
+                elif status == FAILED:
+                    failed.append((order_id, None, "provayder sifarişi ləğv etdi"))
+        if completed:
+            completed = await database.finish_processing_orders(completed)
+            metrics.FULFILLMENT.inc("completed", amount=len(completed))
+            if completed:
+                await self.on_completed(completed)
+        await self._finish_partial(partial)
+        await self._fail(failed)
+        if needs_review and self.on_needs_review is not None:
+            await self.on_needs_review(needs_review)
+
+    async def _finish_partial(self, orders):
+        """[(order_id, remains), ...] — sifarişləri completed edir və icra olunmayan hissənin məbləğini qaytarır."""
+        finished = []
+        for order_id, remains in orders:
+            result = await database.finish_partial_order(order_id, remains)
+            if result is not None:
+                user_id, refunded, new_balance = result
+                finished.append((order_id, user_id, remains, refunded, new_balance))
+        if finished:
+            metrics.FULFILLMENT.inc("partial", amount=len(finished))
+            await self.on_partial(finished)
+
+    async def _fail(self, orders):
+        """[(order_id, user_id, səbəb), ...] — sifarişləri failed edir və məbləği qaytarır."""
+        refunded = []
+        for order_id, _, reason in orders:
+            result = await database.refund_order(order_id, status="failed", from_status="processing")
+            if result is not None:
+                user_id, amount, new_balance = result
+                refunded.append((order_id, user_id, amount, new_balance, reason))
+        if refunded:
+            metrics.FULFILLMENT.inc("failed", amount=len(refunded))
+            await self.on_failed(refunded)
+
+    async def report_unsubmitted(self):
+        """Göndərilərkən proses dayanmış sifarişlərin ID-lərini log-a yazır və qaytarır.
+
+        Onların provayderdə olub-olmadığı bilinmir — çağıran adminə bildirməlidir.
+        """
+        order_ids = await database.get_unsubmitted_processing_orders()
+        if order_ids:
+            logger.warning(f"Orders left in 'processing' without a provider ID (check the panel, then /done or /refund): "
+                           f"{', '.join(map(str, order_ids))}")
+        return order_ids
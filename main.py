@@ -1,18 +1,43 @@
+import asyncio
+import datetime
 import logging
 import os
 import re
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+import tempfile
+import time
+
+import startup # Ağır importlardan əvvəl: onların müddəti də ölçülür
+IMPORTS_STARTED = startup.elapsed()
+
+import httpx
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile, ReplyKeyboardMarkup, KeyboardButton
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
+    ApplicationHandlerStop,
+    TypeHandler,
     filters,
     ContextTypes,
 )
 
+from admin_digest import AdminDigest
+import catalog
 import config
 import database
+import flood_control
+import fulfillment
+import metrics
+from order_parser import parse_order
+from send_queue import SendQueue
+from state_store import SQLiteStatePersistence, StateStore
+from update_processor import PerUserUpdateProcessor
+# Yalnız admin əmrlərində və ya müəyyən rejimdə lazım olan modullar (bulk_ops, export, sharding,
+# webhook_server) istifadə olunduqları yerdə import edilir ki, soyuq başlanğıcı ləngitməsinlər
+
+startup.mark("imports", IMPORTS_STARTED)
 
 # Logları aktivləşdir
 logging.basicConfig(
@@ -21,13 +46,54 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Botun vəziyyətləri (State machine üçün sadə yanaşma)
-USER_STATES = {} # {user_id: current_state}
+def _state_persistence(namespace):
+    return SQLiteStatePersistence(namespace) if config.STATE_PERSISTENCE else None
+
+USER_STATES = StateStore(config.STATE_TTL_SECONDS, config.STATE_MAX_ENTRIES, _state_persistence("user_states")) # {user_id: current_state}
+ORDER_DRAFTS = StateStore(config.STATE_TTL_SECONDS, config.STATE_MAX_ENTRIES, _state_persistence("order_drafts")) # {user_id: sifariş qaralaması}
+# Menyuda seçilmiş kateqoriya yalnız yaddaşdadır (menyuda gəzmək DB-yə yazmır); sifariş qaralaması
+# başlayanda o da qaralamaya yazılır və beləliklə yenidən başladıqdan sonra itmir
+SELECTED_CATEGORIES = StateStore(config.STATE_TTL_SECONDS, config.STATE_MAX_ENTRIES) # {user_id: kateqoriya}
 AWAITING_LINK = 1
 AWAITING_RECEIPT = 2
 AWAITING_ADMIN_REPLY = 3 # İstifadəçi adminə mesaj yazır
 AWAITING_ADMIN_PRICE_CHANGE_SERVICE = 4
 AWAITING_ADMIN_PRICE_CHANGE_AMOUNT = 5
 
+# Telegram-a gedən kütləvi mesajlar bu növbədən keçir (flood limitlərinə düşməmək üçün)
+SEND_QUEUE = SendQueue(config.SEND_RATE_PER_SECOND / config.WORKER_SHARE, config.SEND_PER_CHAT_INTERVAL)
+# Çoxprosesli rejimdə dövri işlər və yayımların bərpası yalnız 0-cı worker-də işləyir
+RUNS_BACKGROUND_JOBS = config.WORKER_INDEX in (None, 0)
+BROADCAST_TASKS = set() # İşləyən yayım tapşırıqları (GC-dən qorumaq və dayandırmaq üçün)
+NOTIFICATION_TASKS = set() # Toplu əməliyyatlardan sonra fonda göndərilən bildirişlər
+
+# Adminə yönləndirilmiş mesaj ID-si -> istifadəçi ID-si (admin_messages cədvəlinin önündə LRU yaddaş keşi)
+ADMIN_REPLY_TARGETS = StateStore(config.ADMIN_MESSAGES_RETENTION_DAYS * 86400, config.ADMIN_REPLY_CACHE_SIZE,
+                                 refresh_on_get=True)
+
+# İstifadəçi başına flood nəzarəti (flood_guard)
+FLOOD_CONTROL = flood_control.FloodControl(config.FLOOD_LIMITS, config.FLOOD_MUTE_AFTER, config.FLOOD_STRIKE_WINDOW,
+                                           config.FLOOD_MUTE_SECONDS, config.FLOOD_MAX_TRACKED_USERS)
+
+# Digest rejimində yeni sifariş/çek bildirişləri toplanıb adminə toplu göndərilir
+# get_receipt_keyboard və remember_admin_message aşağıda təyin olunur, ona görə lambda ilə çağırılır
+ADMIN_DIGEST = AdminDigest(
+    config.ADMIN_ID, config.ADMIN_DIGEST_MAX_ITEMS,
+    receipt_keyboard=lambda receipt_id: get_receipt_keyboard(receipt_id),
+    on_receipt_message=lambda admin_message_id, user_id: remember_admin_message(admin_message_id, user_id),
+) if config.ADMIN_DIGEST_ENABLED else None
+
+metrics.Gauge("bot_user_states", "Entries in USER_STATES", lambda: len(USER_STATES))
+metrics.Gauge("bot_order_drafts", "Entries in ORDER_DRAFTS", lambda: len(ORDER_DRAFTS))
+metrics.Gauge("bot_selected_categories", "Entries in SELECTED_CATEGORIES", lambda: len(SELECTED_CATEGORIES))
+metrics.Gauge("bot_send_queue_depth", "Messages waiting in SEND_QUEUE", lambda: len(SEND_QUEUE))
+metrics.Gauge("bot_time_to_first_response_seconds", "Seconds from process start to the first handled update",
+              lambda: startup.TIME_TO_FIRST_RESPONSE or 0)
+metrics.Gauge("bot_flood_muted_users", "Users currently muted by flood control", lambda: FLOOD_CONTROL.muted_count())
+metrics.Gauge("bot_admin_reply_cache", "Entries in ADMIN_REPLY_TARGETS", lambda: len(ADMIN_REPLY_TARGETS))
+metrics.Gauge("bot_admin_digest_pending", "Notifications waiting in the admin digest", lambda: len(ADMIN_DIGEST) if ADMIN_DIGEST else 0)
+METRICS_SERVER = None
+
 # --- Köməkçi funksiyalar ---
 def get_main_menu_keyboard():
     """Əsas menyu üçün Reply Keyboard yaradır."""
@@ -35,6 +101,7 @@ def get_main_menu_keyboard():
         [KeyboardButton("Balans artır")],
         [KeyboardButton("Balansa baxmaq")],
         [KeyboardButton("Xidmətlər")],
+        [KeyboardButton("Sifarişlərim")],
         [KeyboardButton("Adminlə əlaqə")],
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
@@ -50,18 +117,20 @@ def get_services_menu_keyboard():
     return InlineKeyboardMarkup(keyboard)
 
 # Link təsdiqləmə üçün köməkçi funksiya
+URL_PATTERN = re.compile(
+    r'^(https?://)?(www\.)?(telegram\.me/|t\.me/|instagram\.com/|tiktok\.com/)'
+    r'[a-zA-Z0-9.\-/?&=#_]*$'
+)
+
 def is_valid_url(url: str) -> bool:
     """Telegram, Instagram, Tiktok URL-i olub-olmadığını yoxlayır."""
-    regex = re.compile(
-        r'^(https?://)?(www\.)?(telegram\.me/|t\.me/|instagram\.com/|tiktok\.com/)'
-        r'[a-zA-Z0-9.\-/?&=#_]*$'
-    )
-    return re.match(regex, url) is not None
+    return URL_PATTERN.match(url) is not None
 
 # --- Xəta idarəçiliyi ---
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Botda baş verən bütün xətaları idarə edir."""
     logger.error("Update %s caused error %s", update, context.error)
+    metrics.ERRORS.inc()
     try:
         if update.effective_chat.id == config.ADMIN_ID:
             await context.bot.send_message(
@@ -81,7 +150,7 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """/start əmrini işlədir."""
     user_id = update.message.from_user.id
-    database.init_db()
+    database.register_user(user_id) # yayım siyahısı üçün; cavabı gözləmir
     await update.message.reply_text(
         "Salam! Aşağıdakı menyudan seçim edin:", reply_markup=get_main_menu_keyboard() # Reply Keyboard burada istifadə olunur
     )
@@ -112,57 +181,11 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
             "Xidmətlər kateqoriyasını seçin:", reply_markup=get_services_menu_keyboard()
         )
 
-    elif query.data == "services_tiktok":
-        context.user_data['current_service_category'] = 'tiktok'
-        await query.edit_message_text(
-            """**Tiktok Xidmətləri:**
-
-- 1000 Bəyəni (Like): {:.2f} AZN
-- 1000 İzləyici (Follower): {:.2f} AZN
-- 1000 Baxış (View): {:.2f} AZN
-
-Sifariş vermək üçün istədiyiniz sayı və xidməti qeyd edin (məs: "3k like" və ya "2.5k follower").""".format(
-                database.get_service_price("tiktok_like"),
-                database.get_service_price("tiktok_follower"),
-                database.get_service_price("tiktok_view")
-            ),
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Geri", callback_data="services_menu")]])
-        )
-
-    elif query.data == "services_instagram":
-        context.user_data['current_service_category'] = 'instagram'
-        await query.edit_message_text(
-            """**Instagram Xidmətləri:**
-
-- 1000 Bəyəni (Like): {:.2f} AZN
-- 1000 İzləyici (Follower): {:.2f} AZN
-- 1000 Baxış (View): {:.2f} AZN
-
-Sifariş vermək üçün istədiyiniz sayı və xidməti qeyd edin (məs: "500 like" və ya "1k follower").""".format(
-                database.get_service_price("instagram_like"),
-                database.get_service_price("instagram_follower"),
-                database.get_service_price("instagram_view")
-            ),
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Geri", callback_data="services_menu")]])
-        )
-
-    elif query.data == "services_telegram":
-        context.user_data['current_service_category'] = 'telegram'
-        await query.edit_message_text(
-            """**Telegram Xidmətləri:**
-
-- 1000 Kanal Abunəçisi: {:.2f} AZN
-- 1000 Post Baxışı: {:.2f} AZN
-
-Sifariş vermək üçün istədiyiniz sayı və xidməti qeyd edin (məs: "1k abuneci" və ya "10k baxış").""".format(
-                database.get_service_price("telegram_subscriber"),
-                database.get_service_price("telegram_view")
-            ),
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Geri", callback_data="services_menu")]])
-        )
+    elif query.data.startswith("services_") and catalog.get_menu(query.data[len("services_"):]):
+        category = query.data[len("services_"):]
+        SELECTED_CATEGORIES[user_id] = category
+        menu_text, menu_markup = catalog.get_menu(category)
+        await query.edit_message_text(menu_text, parse_mode="Markdown", reply_markup=menu_markup)
     elif query.data.startswith("admin_reply_to_user_"):
         # Adminin istifadəçiyə cavab düyməsi kliklənəndə
         target_user_id = int(query.data.split("_")[-1])
@@ -173,104 +196,192 @@ Sifariş vermək üçün istədiyiniz sayı və xidməti qeyd edin (məs: "1k ab
         USER_STATES[user_id] = AWAITING_ADMIN_REPLY
 
 # --- Mesaj idarəçiliyi ---
-async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def show_top_up_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.message.from_user.id
-    text = update.message.text.lower()
-
-    # ReplyKeyboardMarkup düymələrindən gələn mətnləri yoxlayırıq
-    if text == "balans artır":
-        await update.message.reply_text(
-            """Balansınızı artırmaq üçün aşağıdakı hesablardan birinə ödəniş edə bilərsiniz:
+    await update.message.reply_text(
+        """Balansınızı artırmaq üçün aşağıdakı hesablardan birinə ödəniş edə bilərsiniz:
 
 **Kapital Bank**: XXXX XXXX XXXX XXXX (Adınız, Soyadınız)
 **Leobank**: XXXX XXXX XXXX XXXX (Adınız, Soyadınız)
 
 Ödəniş etdikdən sonra çeki (skrinşotu) göndərin və "Ödənildi" düyməsinə klikləyin.
 """,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Ödənildi", callback_data="paid_receipt")]])
-        )
-        USER_STATES[user_id] = AWAITING_RECEIPT
-    elif text == "balansa baxmaq":
-        balance = database.get_user_balance(user_id)
-        await update.message.reply_text(f"Sizin cari balansınız: **{balance:.2f} AZN**.", parse_mode="Markdown")
-    elif text == "xidmətlər":
-        await update.message.reply_text(
-            "Xidmətlər kateqoriyasını seçin:", reply_markup=get_services_menu_keyboard()
-        )
-    elif text == "adminlə əlaqə":
-        await update.message.reply_text(
-            "Adminlə əlaqə saxlamaq üçün mesajınızı birbaşa yaza bilərsiniz. Mesajınız adminə yönləndiriləcək."
+        parse_mode="Markdown",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Ödənildi", callback_data="paid_receipt")]])
+    )
+    USER_STATES[user_id] = AWAITING_RECEIPT
+
+async def show_balance(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    balance = await database.get_user_balance(update.message.from_user.id)
+    await update.message.reply_text(f"Sizin cari balansınız: **{balance:.2f} AZN**.", parse_mode="Markdown")
+
+MY_ORDERS_PAGE_SIZE = 5
+ORDER_STATUS_LABELS = {"pending": "⏳ Gözləyir", "processing": "🔄 İcra olunur", "completed": "✅ Tamamlanıb",
+                       "refunded": "↩️ Geri qaytarılıb", "failed": "❌ İcra olunmadı, məbləğ qaytarılıb"}
+
+async def render_my_orders_page(user_id, before=None, after=None):
+    """İstifadəçinin öz sifarişləri səhifəsinin mətni və düymələri (sifariş yoxdursa None, None)."""
+    orders, has_more = await database.get_user_orders_page(user_id, MY_ORDERS_PAGE_SIZE, before=before, after=after)
+    if not orders:
+        return None, None
+
+    if after is not None:
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = before is not None, has_more
+
+    lines = ["**Sifarişləriniz:**\n"]
+    for order_id, service_type, amount, link, status, timestamp, cost in orders:
+        cost_text = f" | Məbləğ: **{cost:.2f} AZN**" if cost is not None else ""
+        lines.append(
+            f"#{order_id} | {service_type.replace('_', ' ').title()} | Miqdar: {amount:g}{cost_text}\n"
+            f"Link: `{link[:60]}`\n"
+            f"Status: {ORDER_STATUS_LABELS.get(status, status)} | Tarix: {timestamp[:16]}"
         )
-        USER_STATES[user_id] = AWAITING_ADMIN_REPLY
 
-    # Admin qiymət dəyişdirir
-    elif user_id == config.ADMIN_ID and USER_STATES.get(user_id) == AWAITING_ADMIN_PRICE_CHANGE_AMOUNT:
-        try:
-            new_price = float(text)
-            if new_price <= 0:
-                await update.message.reply_text("Qiymət müsbət ədəd olmalıdır.")
-                USER_STATES.pop(user_id, None)
-                return
+    buttons = []
+    if has_newer:
+        buttons.append(InlineKeyboardButton("« Yenilər", callback_data=f"my_orders_prev_{orders[0][0]}"))
+    if has_older:
+        buttons.append(InlineKeyboardButton("Köhnələr »", callback_data=f"my_orders_next_{orders[-1][0]}"))
+    return "\n\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def show_my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Sifarişlərim düyməsi və /my_orders: istifadəçinin son sifarişləri."""
+    response_text, reply_markup = await render_my_orders_page(update.message.from_user.id)
+    if response_text is None:
+        await update.message.reply_text("Hələ sifarişiniz yoxdur. Sifariş vermək üçün 'Xidmətlər' bölməsinə keçin.")
+        return
+    await update.message.reply_text(response_text, parse_mode="Markdown", reply_markup=reply_markup)
 
-            service_to_change = context.user_data.get('service_to_change_price')
-            if service_to_change:
-                database.update_service_price(service_to_change, new_price)
-                await update.message.reply_text(f"`{service_to_change}` xidmətinin qiyməti `{new_price:.2f} AZN` olaraq yeniləndi.", parse_mode="Markdown")
-            else:
-                await update.message.reply_text("Xəta: Qiyməti dəyişdiriləcək xidmət tapılmadı.")
-            USER_STATES.pop(user_id, None)
-            context.user_data.pop('service_to_change_price', None)
-        except ValueError:
-            await update.message.reply_text("Yanlış qiymət formatı. Rəqəm daxil edin.")
+async def handle_my_orders_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Sifarişlərim siyahısında Yenilər/Köhnələr düymələri (həmişə düyməni basanın öz sifarişləri)."""
+    query = update.callback_query
+    await query.answer()
+    direction, cursor_order_id = query.data.split("_")[2:]
+    cursor = {"before": int(cursor_order_id)} if direction == "next" else {"after": int(cursor_order_id)}
+    response_text, reply_markup = await render_my_orders_page(query.from_user.id, **cursor)
+    if response_text is None:
+        await query.edit_message_text("Bu səhifədə sifariş yoxdur.")
+        return
+    await query.edit_message_text(response_text, parse_mode="Markdown", reply_markup=reply_markup)
+
+async def show_services_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(
+        "Xidmətlər kateqoriyasını seçin:", reply_markup=get_services_menu_keyboard()
+    )
+
+async def start_admin_contact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(
+        "Adminlə əlaqə saxlamaq üçün mesajınızı birbaşa yaza bilərsiniz. Mesajınız adminə yönləndiriləcək."
+    )
+    USER_STATES[update.message.from_user.id] = AWAITING_ADMIN_REPLY
+
+# Admin qiymət dəyişdirir
+async def handle_price_change_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.message.from_user.id
+    if user_id != config.ADMIN_ID:
+        await handle_order_text(update, context)
+        return
+
+    try:
+        new_price = float(update.message.text.lower())
+        if new_price <= 0:
+            await update.message.reply_text("Qiymət müsbət ədəd olmalıdır.")
             USER_STATES.pop(user_id, None)
+            return
+
+        service_to_change = context.user_data.get('service_to_change_price')
+        if service_to_change:
+            await catalog.set_price(service_to_change, new_price)
+            await update.message.reply_text(f"`{service_to_change}` xidmətinin qiyməti `{new_price:.2f} AZN` olaraq yeniləndi.", parse_mode="Markdown")
+        else:
+            await update.message.reply_text("Xəta: Qiyməti dəyişdiriləcək xidmət tapılmadı.")
+        USER_STATES.pop(user_id, None)
+        context.user_data.pop('service_to_change_price', None)
+    except ValueError:
+        await update.message.reply_text("Yanlış qiymət formatı. Rəqəm daxil edin.")
+        USER_STATES.pop(user_id, None)
+
+async def handle_admin_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.message.from_user.id
 
     # Admin istifadəçiyə cavab yazır
-    elif user_id == config.ADMIN_ID and 'reply_target_user_id' in context.user_data and USER_STATES.get(user_id) == AWAITING_ADMIN_REPLY:
-        target_user_id = context.user_data.pop('reply_target_user_id')
-        try:
-            await context.bot.send_message(
-                chat_id=target_user_id,
-                text=f"**Admindən cavab:**\n\n{update.message.text}",
-                parse_mode="Markdown"
-            )
-            await update.message.reply_text(f"Mesajınız istifadəçi `{target_user_id}`a göndərildi.")
-        except Exception as e:
-            logger.error(f"Failed to send admin reply to user {target_user_id}: {e}")
-            await update.message.reply_text(f"Mesajı istifadəçiyə göndərərkən xəta: {e}")
+    if user_id == config.ADMIN_ID and 'reply_target_user_id' in context.user_data:
+        await send_admin_reply(update, context.user_data.pop('reply_target_user_id'))
         USER_STATES.pop(user_id, None)
+        return
 
-    # Sifariş linki gözlənilir
-    elif USER_STATES.get(user_id) == AWAITING_LINK:
-        service_data = context.user_data.get('current_order')
-        if not service_data:
-            await update.message.reply_text("Xəta: Sifariş məlumatı tapılmadı. Zəhmət olmasa yenidən sifariş edin.", reply_markup=get_main_menu_keyboard())
-            USER_STATES.pop(user_id, None)
-            return
+    # İstifadəçidən adminə mesaj yönləndirmə
+    admin_msg = await context.bot.send_message(
+        chat_id=config.ADMIN_ID,
+        text=f"**İstifadəçidən mesaj (`{user_id}`):**\n\n{update.message.text}\n\n_Cavab vermək üçün bu mesaja reply edin._",
+        parse_mode="Markdown",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cavab ver", callback_data=f"admin_reply_to_user_{user_id}")]])
+    )
+    remember_admin_message(admin_msg.message_id, user_id)
+
+    await update.message.reply_text("Mesajınız adminə çatdırıldı. Tezliklə cavab gözləyin.")
+    USER_STATES.pop(user_id, None)
+
+def remember_admin_message(admin_message_id, user_id):
+    """Adminə göndərilmiş mesajın kimə aid olduğunu keşə və (gözləmədən) bazaya yazır."""
+    ADMIN_REPLY_TARGETS[admin_message_id] = user_id
+    database.save_admin_message_mapping(user_id, admin_message_id)
+
+async def resolve_reply_target(admin_message_id):
+    """Admin reply etdiyi mesajın istifadəçisini tapır: əvvəl keş, sonra indeksli sorğu."""
+    user_id = ADMIN_REPLY_TARGETS.get(admin_message_id)
+    if user_id is None:
+        user_id = await database.get_user_id_from_admin_message_id(admin_message_id)
+        if user_id is not None:
+            ADMIN_REPLY_TARGETS[admin_message_id] = user_id
+    return user_id
+
+async def send_admin_reply(update: Update, target_user_id: int) -> None:
+    try:
+        await update.get_bot().send_message(
+            chat_id=target_user_id,
+            text=f"**Admindən cavab:**\n\n{update.message.text}",
+            parse_mode="Markdown"
+        )
+        await update.message.reply_text(f"Mesajınız istifadəçi `{target_user_id}`a göndərildi.")
+    except Exception as e:
+        logger.error(f"Failed to send admin reply to user {target_user_id}: {e}")
+        await update.message.reply_text(f"Mesajı istifadəçiyə göndərərkən xəta: {e}")
 
-        link = update.message.text
-        if not is_valid_url(link):
-            await update.message.reply_text("Yanlış link formatı. Zəhmət olmasa düzgün Telegram, Instagram, və ya Tiktok linki göndərin.")
-            return
+# Sifariş linki gözlənilir
+async def handle_order_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.message.from_user.id
+    service_data = ORDER_DRAFTS.get(user_id)
+    if not service_data:
+        await update.message.reply_text("Xəta: Sifariş məlumatı tapılmadı. Zəhmət olmasa yenidən sifariş edin.", reply_markup=get_main_menu_keyboard())
+        USER_STATES.pop(user_id, None)
+        return
 
-        service_type = service_data['service_type']
-        amount = service_data['amount']
-        
-        # Balansdan çıxarış
-        current_balance = database.get_user_balance(user_id)
-        if current_balance < service_data['total_cost']:
-            await update.message.reply_text(f"Xəta: Balansınız sifariş üçün kifayət deyil. Cari balansınız: **{current_balance:.2f} AZN**. Zəhmət olmasa balansınızı artırın.", parse_mode="Markdown")
-            USER_STATES.pop(user_id, None)
-            context.user_data.pop('current_order', None)
-            return
+    link = update.message.text
+    if not is_valid_url(link):
+        await update.message.reply_text("Yanlış link formatı. Zəhmət olmasa düzgün Telegram, Instagram, və ya Tiktok linki göndərin.")
+        return
 
-        database.update_user_balance(user_id, -service_data['total_cost']) # Balansdan çıxarılır
+    service_type = service_data['service_type']
+    amount = service_data['amount']
 
-        order_id = database.add_order(user_id, service_type, amount, link)
+    # Balansdan çıxarış və sifariş bir tranzaksiyada
+    order_id, new_balance = await database.place_order(user_id, service_type, amount, link, service_data['total_cost'])
+    if order_id is None:
+        await update.message.reply_text(f"Xəta: Balansınız sifariş üçün kifayət deyil. Cari balansınız: **{new_balance:.2f} AZN**. Zəhmət olmasa balansınızı artırın.", parse_mode="Markdown")
+        USER_STATES.pop(user_id, None)
+        reset_order_draft(user_id, service_data)
+        return
 
-        await update.message.reply_text(f"Sifarişiniz (`{order_id}`) qeydə alındı! Tezliklə tamamlanacaq. Yeni balansınız: **{database.get_user_balance(user_id):.2f} AZN**.", parse_mode="Markdown")
-        
-        # Adminə sifariş bildirişi
+    metrics.ORDERS.inc()
+    await update.message.reply_text(f"Sifarişiniz (`{order_id}`) qeydə alındı! Tezliklə tamamlanacaq. Yeni balansınız: **{new_balance:.2f} AZN**.", parse_mode="Markdown")
+    
+    # Adminə sifariş bildirişi
+    if ADMIN_DIGEST is not None:
+        await ADMIN_DIGEST.add_order(context.bot, order_id, user_id, service_type, amount, link)
+    else:
         await context.bot.send_message(
             chat_id=config.ADMIN_ID,
             text=f"**Yeni Sifariş!**\n"
@@ -279,100 +390,204 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                  f"Miqdar: `{amount}`\n"
                  f"Link: `{link}`\n"
                  f"Sifariş ID: `{order_id}`\n\n"
-                 f"Sifarişi tamamladıqda `/done {order_id}` yazın.",
+                 + (f"Sifariş avtomatik icraya göndəriləcək; lazım olsa `/done {order_id}` ilə əl ilə bağlaya bilərsiniz."
+                    if config.FULFILLMENT_API_URL and service_type in config.FULFILLMENT_SERVICES
+                    else f"Sifarişi tamamladıqda `/done {order_id}` yazın."),
             parse_mode="Markdown"
         )
-        USER_STATES.pop(user_id, None)
-        context.user_data.pop('current_order', None)
+    USER_STATES.pop(user_id, None)
+    reset_order_draft(user_id, service_data)
 
-    # İstifadəçidən adminə mesaj yönləndirmə
-    elif USER_STATES.get(user_id) == AWAITING_ADMIN_REPLY:
-        admin_msg = await context.bot.send_message(
-            chat_id=config.ADMIN_ID,
-            text=f"**İstifadəçidən mesaj (`{user_id}`):**\n\n{update.message.text}",
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Cavab ver", callback_data=f"admin_reply_to_user_{user_id}")]])
+def reset_order_draft(user_id, draft):
+    """Bitmiş sifarişin qaralamasını silir, seçilmiş kateqoriyanı isə növbəti sifariş üçün yaddaşda saxlayır."""
+    ORDER_DRAFTS.pop(user_id, None)
+    if draft.get('category'):
+        SELECTED_CATEGORIES[user_id] = draft['category']
+
+# Xidmət sifarişlərini emal et (məs: "3k like")
+async def handle_order_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.message.from_user.id
+    category = SELECTED_CATEGORIES.get(user_id) or (ORDER_DRAFTS.get(user_id) or {}).get('category', '')
+    parsed = parse_order(update.message.text.lower(), category)
+    if parsed is None:
+        # Əgər heç bir əmr və ya sifariş formatı deyilsə, əsas menyunu göstər.
+        await update.message.reply_text(
+            "Mən sizi başa düşmədim. Zəhmət olmasa menyudan seçim edin:", reply_markup=get_main_menu_keyboard()
         )
-        database.save_admin_message_mapping(user_id, admin_msg.message_id)
-        
-        await update.message.reply_text("Mesajınız adminə çatdırıldı. Tezliklə cavab gözləyin.")
-        USER_STATES.pop(user_id, None)
+        return
 
-    # Xidmət sifarişlərini emal et (bu hissə hələ də ReplyKeyboard ilə yox, manual mətn daxil etməklə işləyir)
+    amount_base, service_keyword, service_type_full = parsed
+    price_per_k = catalog.get_price(service_type_full)
+    if price_per_k is None:
+        await update.message.reply_text("Bu xidmət növü tapılmadı. Zəhmət olmasa düzgün xidmət növü seçin.")
+        return
+
+    total_cost = (amount_base / 1000) * price_per_k
+    user_balance = await database.get_user_balance(user_id)
+
+    if user_balance >= total_cost:
+        ORDER_DRAFTS[user_id] = {
+            'category': category,
+            'service_type': service_type_full,
+            'amount': amount_base,
+            'total_cost': total_cost
+        }
+        await update.message.reply_text("Post/səhifə linkini göndərin.")
+        USER_STATES[user_id] = AWAITING_LINK
     else:
-        match = re.match(r"(\d+\.?\d*)\s*(k)?\s*(like|follower|view|abuneci|baxis)", text)
-        if match:
-            num_str, k_prefix, service_keyword = match.groups()
-            try:
-                amount_base = float(num_str) * (1000 if k_prefix else 1)
-            except ValueError:
-                await update.message.reply_text("Yanlış miqdar formatı. Məsələn, '3k' və ya '500' yazın.")
-                return
+        needed_amount = total_cost - user_balance
+        await update.message.reply_text(
+            f"Balansınız kifayət deyil. Bu sifariş ({amount_base} {service_keyword}) üçün sizə **{needed_amount:.2f} AZN** lazımdır. Balansınızı artırmaq üçün 'Balans artır' düyməsinə klikləyin.",
+            parse_mode="Markdown",
+        )
 
-            service_type_full = None
-            current_category = context.user_data.get('current_service_category', '')
-
-            if "like" in service_keyword:
-                service_type_full = "tiktok_like" if "tiktok" in current_category else "instagram_like"
-            elif "follower" in service_keyword:
-                service_type_full = "tiktok_follower" if "tiktok" in current_category else "instagram_follower"
-            elif "view" in service_keyword:
-                service_type_full = "tiktok_view" if "tiktok" in current_category else ("instagram_view" if "instagram" in current_category else "telegram_view")
-            elif "abuneci" in service_keyword:
-                service_type_full = "telegram_subscriber"
-            elif "baxis" in service_keyword:
-                service_type_full = "telegram_view"
-            
-            if service_type_full:
-                price_per_k = database.get_service_price(service_type_full)
-                if price_per_k is None:
-                    await update.message.reply_text("Bu xidmət növü tapılmadı. Zəhmət olmasa düzgün xidmət növü seçin.")
-                    return
-
-                total_cost = (amount_base / 1000) * price_per_k
-                user_balance = database.get_user_balance(user_id)
-
-                if user_balance >= total_cost:
-                    context.user_data['current_order'] = {
-                        'service_type': service_type_full,
-                        'amount': amount_base,
-                        'total_cost': total_cost
-                    }
-                    await update.message.reply_text("Post/səhifə linkini göndərin.")
-                    USER_STATES[user_id] = AWAITING_LINK
-                else:
-                    needed_amount = total_cost - user_balance
-                    await update.message.reply_text(
-                        f"Balansınız kifayət deyil. Bu sifariş ({amount_base} {service_keyword}) üçün sizə **{needed_amount:.2f} AZN** lazımdır. Balansınızı artırmaq üçün 'Balans artır' düyməsinə klikləyin.",
-                        parse_mode="Markdown",
-                        # Əgər balans artır düyməsi daimi klaviaturadadırsa, burada ReplyKeyboard göstərmək olar
-                        # Lakin bu məqsədlə istifadəçini əsas menyuya yönləndirmək daha məntiqlidir.
-                    )
-            else:
-                await update.message.reply_text("Anlaşılmayan sifariş formatı. Zəhmət olmasa '3k like' kimi yazın.")
-        else:
-            # Əgər heç bir əmr və ya sifariş formatı deyilsə, əsas menyunu göstər.
-            await update.message.reply_text(
-                "Mən sizi başa düşmədim. Zəhmət olmasa menyudan seçim edin:", reply_markup=get_main_menu_keyboard()
-            )
+# ReplyKeyboardMarkup düymələrinin mətni (kiçik hərflə) -> idarəçi
+MENU_HANDLERS = {
+    "balans artır": show_top_up_info,
+    "balansa baxmaq": show_balance,
+    "xidmətlər": show_services_menu,
+    "sifarişlərim": show_my_orders,
+    "adminlə əlaqə": start_admin_contact,
+}
+
+# İstifadəçinin vəziyyəti -> idarəçi. Cədvəldə olmayan vəziyyətlərdə mətn sifariş kimi təhlil olunur.
+STATE_HANDLERS = {
+    AWAITING_ADMIN_PRICE_CHANGE_AMOUNT: handle_price_change_amount,
+    AWAITING_ADMIN_REPLY: handle_admin_conversation,
+    AWAITING_LINK: handle_order_link,
+}
+
+async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Admin yönləndirilmiş mesaja (və ya çekə) reply edirsə, cavab birbaşa həmin istifadəçiyə gedir
+    reply_to = update.message.reply_to_message
+    if reply_to is not None and update.message.from_user.id == config.ADMIN_ID:
+        target_user_id = await resolve_reply_target(reply_to.message_id)
+        if target_user_id is not None:
+            await send_admin_reply(update, target_user_id)
+            return
+
+    handler = MENU_HANDLERS.get(update.message.text.lower())
+    if handler is None:
+        handler = STATE_HANDLERS.get(USER_STATES.get(update.message.from_user.id), handle_order_text)
+    await handler(update, context)
 
 
 async def handle_photo_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.message.from_user.id
     if USER_STATES.get(user_id) == AWAITING_RECEIPT:
         photo_file = update.message.photo[-1].file_id # Ən böyük şəkli götür
-        admin_message = await context.bot.send_photo(
-            chat_id=config.ADMIN_ID,
-            photo=photo_file,
-            caption=f"**Yeni ödəniş çeki!**\nİstifadəçi ID: `{user_id}`\n\n"
-                    f"Balansı artırmaq üçün `/add {user_id} <məbləğ>` yazın.",
-            parse_mode="Markdown"
-        )
+        receipt_id = await database.add_receipt(user_id, photo_file)
+        if ADMIN_DIGEST is not None:
+            await ADMIN_DIGEST.add_receipt(context.bot, receipt_id, user_id, photo_file)
+        else:
+            await send_receipt_to_admin(context.bot, receipt_id, user_id, photo_file)
         await update.message.reply_text("Çekiniz uğurla göndərildi. Balansınızın təsdiqlənməsini gözləyin.")
         USER_STATES.pop(user_id, None)
     else:
         await update.message.reply_text("Mən bu şəkli nə üçün istifadə edəcəyimi bilmirəm. Zəhmət olmasa menyudan seçim edin.")
 
+# --- Ödəniş çekləri ---
+RECEIPTS_PAGE_SIZE = 10
+
+def get_receipt_keyboard(receipt_id):
+    """Çek üçün hazır məbləğ (təsdiq) və rədd düymələri."""
+    presets = [
+        InlineKeyboardButton(f"✅ {amount:g} AZN", callback_data=f"receipt_approve_{receipt_id}_{amount:g}")
+        for amount in config.RECEIPT_PRESET_AMOUNTS
+    ]
+    return InlineKeyboardMarkup([presets, [InlineKeyboardButton("❌ Rədd et", callback_data=f"receipt_reject_{receipt_id}")]])
+
+def receipt_caption(receipt_id, user_id):
+    return (f"**Ödəniş çeki #{receipt_id}**\nİstifadəçi ID: `{user_id}`\n\n"
+            f"Məbləği seçin və ya `/approve {receipt_id} <məbləğ>` yazın.")
+
+async def send_receipt_to_admin(bot, receipt_id, user_id, file_id):
+    admin_message = await bot.send_photo(
+        chat_id=config.ADMIN_ID,
+        photo=file_id,
+        caption=receipt_caption(receipt_id, user_id),
+        parse_mode="Markdown",
+        reply_markup=get_receipt_keyboard(receipt_id)
+    )
+    remember_admin_message(admin_message.message_id, user_id)
+
+async def resolve_receipt(bot, receipt_id, amount=None):
+    """Çeki təsdiqləyir (amount verilibsə) və ya rədd edir, istifadəçiyə bildirir, adminə nəticə mətnini qaytarır."""
+    if amount is None:
+        user_id = await database.reject_receipt(receipt_id)
+        if user_id is None:
+            return f"Çek #{receipt_id} artıq bağlanıb və ya tapılmadı."
+        notification = "Göndərdiyiniz ödəniş çeki təsdiqlənmədi. Sualınız varsa adminlə əlaqə saxlayın."
+        result = f"Çek #{receipt_id} rədd edildi (istifadəçi {user_id})."
+    else:
+        approved = await database.approve_receipt(receipt_id, amount)
+        if approved is None:
+            return f"Çek #{receipt_id} artıq bağlanıb və ya tapılmadı."
+        user_id, new_balance = approved
+        notification = f"Hörmətli istifadəçi, `{amount:.2f} AZN` balansınıza əlavə olundu. Yeni balansınız: **{new_balance:.2f} AZN**."
+        result = f"Çek #{receipt_id} təsdiqləndi: +{amount:.2f} AZN (istifadəçi {user_id}, yeni balans {new_balance:.2f} AZN)."
+
+    try:
+        await bot.send_message(chat_id=user_id, text=notification, parse_mode="Markdown")
+    except Exception as e:
+        logger.error(f"Could not send receipt notification to user {user_id} for receipt {receipt_id}: {e}")
+    return result
+
+async def handle_receipt_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Çek düymələri: receipt_approve_<id>_<məbləğ> və receipt_reject_<id>."""
+    query = update.callback_query
+    if query.from_user.id != config.ADMIN_ID:
+        await query.answer()
+        return
+
+    parts = query.data.split("_")
+    receipt_id = int(parts[2])
+    amount = float(parts[3]) if parts[1] == "approve" else None
+    result = await resolve_receipt(context.bot, receipt_id, amount)
+    await query.answer(result)
+    try:
+        await query.edit_message_caption(caption=result, reply_markup=None)
+    except Exception as e:
+        logger.warning(f"Could not update receipt message {receipt_id}: {e}")
+
+async def approve_receipt_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin üçün çeki istənilən məbləğlə təsdiqləmək: /approve <çek_id> <məbləğ>"""
+    if update.message.from_user.id != config.ADMIN_ID:
+        await update.message.reply_text("Sizin bu əmri istifadə etmək səlahiyyətiniz yoxdur.")
+        return
+
+    args = context.args
+    if len(args) != 2:
+        await update.message.reply_text("Yanlış format. İstifadə: `/approve <çek_id> <məbləğ>`")
+        return
+
+    try:
+        receipt_id = int(args[0])
+        amount = float(args[1])
+    except ValueError:
+        await update.message.reply_text("Çek ID və ya məbləğ düzgün formatda deyil.")
+        return
+    if amount <= 0:
+        await update.message.reply_text("Məbləğ müsbət ədəd olmalıdır.")
+        return
+
+    await update.message.reply_text(await resolve_receipt(context.bot, receipt_id, amount))
+
+async def get_receipts_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin üçün gözləyən çeklər: /receipts — ən köhnələr düymələri ilə yenidən göndərilir."""
+    if update.message.from_user.id != config.ADMIN_ID:
+        await update.message.reply_text("Sizin bu əmri istifadə etmək səlahiyyətiniz yoxdur.")
+        return
+
+    receipts, pending_count = await database.get_pending_receipts(RECEIPTS_PAGE_SIZE)
+    if not receipts:
+        await update.message.reply_text("Gözləyən çek yoxdur.")
+        return
+
+    await update.message.reply_text(f"Gözləyən çeklər: {pending_count} (ən köhnə {len(receipts)} göstərilir).")
+    for receipt_id, user_id, file_id, created_at in receipts:
+        await send_receipt_to_admin(context.bot, receipt_id, user_id, file_id)
+
 # --- Admin əmrləri ---
 async def add_balance_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Admin üçün balans artırma əmri: /add <istifadeçi_id> <mebleğ>"""
@@ -382,7 +597,7 @@ async def add_balance_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     args = context.args
     if len(args) != 2:
-        await update.message.reply_text("Yanlış format. İstifadə: `/add <istifadəçi_id> <məbləğ>`")
+        await update.message.reply_text("Yanlış format. İstifadə: `/add <istifadəçi_id> <məbləğ>` (toplu əlavə üçün `user_id,amount` CSV faylı göndərin)")
         return
 
     try:
@@ -392,9 +607,7 @@ async def add_balance_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text("Məbləğ müsbət ədəd olmalıdır.")
             return
 
-        old_balance = database.get_user_balance(target_user_id)
-        database.update_user_balance(target_user_id, amount)
-        new_balance = database.get_user_balance(target_user_id)
+        new_balance = await database.update_user_balance(target_user_id, amount)
 
         await update.message.reply_text(
             f"İstifadəçi `{target_user_id}` balansına `{amount:.2f} AZN` əlavə olundu. Yeni balans: `{new_balance:.2f} AZN`.",
@@ -421,68 +634,241 @@ async def done_order_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return
 
     args = context.args
-    if len(args) != 1:
-        await update.message.reply_text("Yanlış format. İstifadə: `/done <sifariş_id>`")
+    if not args:
+        await update.message.reply_text("Yanlış format. İstifadə: `/done <sifariş_id>` və ya `/done 12,15,20-30`")
+        return
+
+    if len(args) > 1 or not args[0].isdigit():
+        await complete_orders_bulk(update, context, " ".join(args))
+        return
+
+    for message in await complete_order(context.bot, int(args[0])):
+        await update.message.reply_text(message)
+
+async def handle_order_done_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin digest mesajındakı "✅ <id>" düyməsi — /done ilə eynidir."""
+    query = update.callback_query
+    if query.from_user.id != config.ADMIN_ID:
+        await query.answer()
         return
 
+    order_id = int(query.data.split("_")[-1])
+    messages = await complete_order(context.bot, order_id)
+    await query.answer(messages[0].replace("`", ""))
+    for message in messages[1:]:
+        await context.bot.send_message(chat_id=config.ADMIN_ID, text=message)
+
+ORDER_COMPLETED_MESSAGE = "Hörmətli istifadəçi, sifarişiniz (`{order_id}`) tamamlandı! Xidmətlərimizdən istifadə etdiyiniz üçün təşəkkür edirik."
+
+async def complete_order(bot, order_id):
+    """Sifarişi tamamlanmış kimi işarələyir, istifadəçiyə bildirir və adminə göstəriləcək mesajları qaytarır.
+
+    Toplu /done ilə eyni yoxlama: yalnız hələ açıq (pending, processing) sifariş tamamlanır.
+    """
+    completed, already_closed, _ = await database.complete_orders([order_id])
+
+    if already_closed:
+        status = already_closed[0][1]
+        return [f"Sifariş `{order_id}` artıq bağlanıb ({ORDER_STATUS_LABELS.get(status, status)})."]
+
+    if not completed:
+        return [f"Sifariş ID `{order_id}` tapılmadı."]
+
+    user_id = completed[0][1]
+    messages = [f"Sifariş `{order_id}` tamamlandı olaraq işarələndi."]
+
     try:
-        order_id = int(args[0])
-        order_details = database.get_order_details(order_id)
+        await bot.send_message(
+            chat_id=user_id,
+            text=ORDER_COMPLETED_MESSAGE.format(order_id=order_id),
+            parse_mode="Markdown"
+        )
+    except Exception as e:
+        logger.error(f"Could not send completion message to user {user_id} for order {order_id}: {e}")
+        messages.append(f"Sifariş `{order_id}` tamamlanma bildirişini istifadəçiyə göndərərkən xəta: {e}")
+    return messages
+
+# --- Toplu admin əməliyyatları ---
+def format_bulk_errors(errors, limit=10):
+    lines = errors[:limit]
+    if len(errors) > limit:
+        lines.append(f"... və daha {len(errors) - limit} xəta")
+    return "\n".join(lines)
+
+async def notify_users(messages):
+    """[(chat_id, mətn), ...] bildirişlərini SEND_QUEUE ilə göndərir, alınmayanların sayını qaytarır."""
+    results = await asyncio.gather(*(SEND_QUEUE.send_message(chat_id, text, parse_mode="Markdown") for chat_id, text in messages))
+    return sum(result is None for result in results)
+
+def notify_users_in_background(messages, description):
+    """Bildirişləri adminin cavabını gözlətmədən fonda göndərir; alınmayanlar olsa sonda adminə yazır."""
+    async def run():
+        failed = await notify_users(messages)
+        if failed:
+            await SEND_QUEUE.send_message(config.ADMIN_ID, f"{description}: {failed} istifadəçiyə bildiriş göndərilmədi.")
+
+    task = asyncio.create_task(run())
+    NOTIFICATION_TASKS.add(task)
+    task.add_done_callback(NOTIFICATION_TASKS.discard)
+
+async def complete_orders_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    """Siyahı/aralıq ilə verilmiş sifarişləri bir tranzaksiyada tamamlayır və bir yekun cavab göndərir."""
+    from bulk_ops import parse_order_ids
+    order_ids, errors = parse_order_ids(text, config.BULK_MAX_ROWS)
+    if not order_ids:
+        await update.message.reply_text(format_bulk_errors(errors) or "Sifariş ID tapılmadı.")
+        return
 
-        if not order_details:
-            await update.message.reply_text(f"Sifariş ID `{order_id}` tapılmadı.")
-            return
+    completed, already_closed, missing = await database.complete_orders(order_ids)
+    notify_users_in_background([
+        (user_id, ORDER_COMPLETED_MESSAGE.format(order_id=order_id)) for order_id, user_id in completed
+    ], f"Toplu /done ({len(completed)} sifariş)")
+
+    summary = [f"Tamamlandı: {len(completed)} sifariş. İstifadəçilərə bildirişlər fonda göndərilir."]
+    if already_closed:
+        summary.append(f"Artıq bağlanmışdı: {', '.join(f'{order_id} ({status})' for order_id, status in already_closed[:20])}"
+                       + (" ..." if len(already_closed) > 20 else ""))
+    if missing:
+        summary.append(f"Tapılmadı: {', '.join(map(str, missing[:20]))}" + (" ..." if len(missing) > 20 else ""))
+    if errors:
+        summary.append(format_bulk_errors(errors))
+    await update.message.reply_text("\n".join(summary))
+
+async def add_balances_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
+    """CSV-dəki (user_id,amount) sətirlərini bir tranzaksiyada balanslara əlavə edir."""
+    from bulk_ops import parse_balance_csv
+    entries, errors = parse_balance_csv(text, config.BULK_MAX_ROWS)
+    if not entries:
+        await update.message.reply_text(format_bulk_errors(errors) or "Faylda `user_id,amount` sətri tapılmadı.")
+        return
 
-        if order_details[4] == 'completed': # Status indexi 4-dür
-            await update.message.reply_text(f"Sifariş `{order_id}` artıq tamamlanmış olaraq qeyd olunub.")
-            return
+    balances = await database.bulk_update_balances(entries)
+    notify_users_in_background([
+        (user_id, f"Hörmətli istifadəçi, `{amount:.2f} AZN` balansınıza əlavə olundu. Yeni balansınız: **{balances[user_id]:.2f} AZN**.")
+        for user_id, amount in entries
+    ], f"Toplu balans artırılması ({len(entries)} sətir)")
+
+    summary = [f"Balans artırıldı: {len(entries)} sətir, {len(balances)} istifadəçi, cəmi {sum(amount for _, amount in entries):.2f} AZN. "
+               f"İstifadəçilərə bildirişlər fonda göndərilir."]
+    if errors:
+        summary.append(f"Ötürülən sətirlər ({len(errors)}):\n{format_bulk_errors(errors)}")
+    await update.message.reply_text("\n".join(summary))
+
+async def handle_admin_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin CSV faylı göndərir: başlıqsız/`/add` — `user_id,amount` sətirləri, `/done` başlığı ilə — sifariş ID-ləri."""
+    document = update.message.document
+    if document.file_size and document.file_size > config.BULK_MAX_FILE_SIZE:
+        await update.message.reply_text(f"Fayl çox böyükdür (maksimum {config.BULK_MAX_FILE_SIZE // 1024} KB).")
+        return
 
-        database.update_order_status(order_id, 'completed')
-        
-        user_id = order_details[0] # user_id indexi 0-dır
-        
-        await update.message.reply_text(f"Sifariş `{order_id}` tamamlandı olaraq işarələndi.")
-        
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"Hörmətli istifadəçi, sifarişiniz (`{order_id}`) tamamlandı! Xidmətlərimizdən istifadə etdiyiniz üçün təşəkkür edirik.",
-                parse_mode="Markdown"
-            )
-        except Exception as e:
-            logger.error(f"Could not send completion message to user {user_id} for order {order_id}: {e}")
-            await update.message.reply_text(f"Sifariş `{order_id}` tamamlanma bildirişini istifadəçiyə göndərərkən xəta: {e}")
+    telegram_file = await document.get_file()
+    try:
+        text = (await telegram_file.download_as_bytearray()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        await update.message.reply_text("Fayl UTF-8 mətn (CSV) olmalıdır.")
+        return
 
-    except ValueError:
-        await update.message.reply_text("Sifariş ID düzgün formatda deyil.")
+    caption = (update.message.caption or "").strip().lower()
+    if caption.lstrip("/").startswith("done"):
+        await complete_orders_bulk(update, context, text)
+    else:
+        await add_balances_bulk(update, context, text)
+
+ORDERS_PAGE_SIZE = 10
+ORDER_FILTER_KEYS = {"status": "status", "service": "service_type", "user": "user_id", "archive": "archived"}
+# Hər /orders siyahısının filtrləri öz mesajına bağlıdır ki, köhnə siyahının düymələri yeni filtrlərlə qarışmasın
+ORDERS_LIST_FILTERS = StateStore(24 * 3600, 100, _state_persistence("orders_filters")) # {siyahı mesajının ID-si: filtrlər}
+ORDERS_CURSOR_FORMAT = "%Y%m%d%H%M%S" # callback_data-da kursorun timestamp hissəsi
+
+def format_orders_cursor(order):
+    """(timestamp, order_id) kursoru callback_data üçün: sifariş arxivə köçsə də səhifələmə davam edir."""
+    timestamp = datetime.datetime.strptime(order[6], "%Y-%m-%d %H:%M:%S")
+    return f"{timestamp.strftime(ORDERS_CURSOR_FORMAT)}_{order[0]}"
+
+def parse_orders_cursor(timestamp, order_id):
+    return datetime.datetime.strptime(timestamp, ORDERS_CURSOR_FORMAT).strftime("%Y-%m-%d %H:%M:%S"), int(order_id)
+
+async def render_orders_page(order_filters, before=None, after=None):
+    """Sifarişlər səhifəsinin mətnini və naviqasiya düymələrini qaytarır (boşdursa None, None).
+
+    before/after — (timestamp, order_id) kursoru.
+    """
+    orders, has_more = await database.get_orders_page(ORDERS_PAGE_SIZE, before=before, after=after, **order_filters)
+    if not orders:
+        return None, None
+
+    if after is not None:
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = before is not None, has_more
+
+    lines = ["**Sifarişlər:**\n"]
+    for order_id, user_id, service_type, amount, link, status, timestamp in orders:
+        lines.append(
+            f"ID: `{order_id}` | User: `{user_id}` | Xidmət: `{service_type}` | Miqdar: `{amount}`\n"
+            f"Link: `{link[:200]}`\n"
+            f"Status: `{status}` | Tarix: `{timestamp}`\n"
+            f"-----------------------------------"
+        )
+
+    buttons = []
+    if has_newer:
+        buttons.append(InlineKeyboardButton("« Əvvəlki", callback_data=f"orders_prev_{format_orders_cursor(orders[0])}"))
+    if has_older:
+        buttons.append(InlineKeyboardButton("Növbəti »", callback_data=f"orders_next_{format_orders_cursor(orders[-1])}"))
+    return "\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
 
 async def get_orders_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Admin üçün sifarişlərin siyahısına baxmaq: /orders"""
+    """Admin üçün sifarişlərin siyahısına baxmaq: /orders [status=<status>] [service=<xidmət>] [user=<istifadəçi_id>] [archive=1]"""
     if update.message.from_user.id != config.ADMIN_ID:
         await update.message.reply_text("Sizin bu əmri istifadə etmək səlahiyyətiniz yoxdur.")
         return
 
-    orders = database.get_all_orders()
-    if not orders:
+    order_filters = {}
+    for arg in context.args:
+        key, _, value = arg.partition("=")
+        if key not in ORDER_FILTER_KEYS or not value:
+            await update.message.reply_text("Yanlış filtr. İstifadə: `/orders status=pending service=tiktok_like user=123` (arxiv üçün `archive=1`)", parse_mode="Markdown")
+            return
+        order_filters[ORDER_FILTER_KEYS[key]] = value
+    if 'user_id' in order_filters:
+        try:
+            order_filters['user_id'] = int(order_filters['user_id'])
+        except ValueError:
+            await update.message.reply_text("İstifadəçi ID düzgün formatda deyil.")
+            return
+    if 'archived' in order_filters:
+        order_filters['archived'] = order_filters['archived'] in ("1", "yes", "true")
+
+    response_text, reply_markup = await render_orders_page(order_filters)
+    if response_text is None:
         await update.message.reply_text("Heç bir sifariş tapılmadı.")
         return
+    message = await update.message.reply_text(response_text, parse_mode="Markdown", reply_markup=reply_markup)
+    if reply_markup is not None:
+        ORDERS_LIST_FILTERS[message.message_id] = order_filters
 
-    response_text = "**Bütün Sifarişlər:**\n\n"
-    for order in orders:
-        order_id, user_id, service_type, amount, link, status, timestamp = order
-        response_text += (
-            f"ID: `{order_id}` | User: `{user_id}` | Xidmət: `{service_type}` | Miqdar: `{amount}`\n"
-            f"Link: {link}\n"
-            f"Status: `{status}` | Tarix: `{timestamp}`\n"
-            f"-----------------------------------\n"
-        )
-    
-    # Mesaj çox uzun olarsa, hissələrə bölmək lazım ola bilər
-    if len(response_text) > 4096:
-        for i in range(0, len(response_text), 4096):
-            await update.message.reply_text(response_text[i:i+4096], parse_mode="Markdown")
-    else:
-        await update.message.reply_text(response_text, parse_mode="Markdown")
+async def handle_orders_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/orders siyahısında Əvvəlki/Növbəti düymələri."""
+    query = update.callback_query
+    await query.answer()
+    if query.from_user.id != config.ADMIN_ID:
+        return
+
+    order_filters = ORDERS_LIST_FILTERS.get(query.message.message_id)
+    if order_filters is None:
+        await query.edit_message_text("Bu siyahı köhnəlib. `/orders` əmrini yenidən göndərin.", parse_mode="Markdown")
+        return
+    ORDERS_LIST_FILTERS[query.message.message_id] = order_filters # müddəti uzadılır
+
+    _, direction, timestamp, order_id = query.data.split("_")
+    cursor = parse_orders_cursor(timestamp, order_id)
+    cursor = {"before": cursor} if direction == "next" else {"after": cursor}
+    response_text, reply_markup = await render_orders_page(order_filters, **cursor)
+    if response_text is None:
+        await query.edit_message_text("Bu səhifədə sifariş yoxdur.")
+        return
+    await query.edit_message_text(response_text, parse_mode="Markdown", reply_markup=reply_markup)
 
 async def get_balance_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Admin üçün istifadəçi balansına baxmaq: /get_balance <user_id>"""
@@ -497,13 +883,154 @@ async def get_balance_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     try:
         target_user_id = int(args[0])
-        balance = database.get_user_balance(target_user_id)
-        await update.message.reply_text(
-            f"İstifadəçi `{target_user_id}` balans: **{balance:.2f} AZN**.",
-            parse_mode="Markdown"
-        )
     except ValueError:
         await update.message.reply_text("İstifadəçi ID düzgün formatda deyil.")
+        return
+
+    balance, ledger_balance = await database.reconcile_balance(target_user_id)
+    ledger_status = "uyğundur" if balance == ledger_balance else f"UYĞUN DEYİL (ledger: {ledger_balance:.2f} AZN)"
+    await update.message.reply_text(
+        f"İstifadəçi `{target_user_id}` balans: **{balance:.2f} AZN**.\nLedger: {ledger_status}",
+        parse_mode="Markdown"
+    )
+
+async def refund_order_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin üçün sifarişin məbləğini geri qaytarmaq: /refund <sifariş_id>"""
+    if update.message.from_user.id != config.ADMIN_ID:
+        await update.message.reply_text("Sizin bu əmri istifadə etmək səlahiyyətiniz yoxdur.")
+        return
+
+    args = context.args
+    if len(args) != 1:
+        await update.message.reply_text("Yanlış format. İstifadə: `/refund <sifariş_id>`")
+        return
+
+    try:
+        order_id = int(args[0])
+    except ValueError:
+        await update.message.reply_text("Sifariş ID düzgün formatda deyil.")
+        return
+
+    result = await database.refund_order(order_id)
+    if result is None:
+        await update.message.reply_text(f"Sifariş `{order_id}` üçün qaytarılacaq ödəniş tapılmadı (və ya artıq qaytarılıb).")
+        return
+
+    user_id, refunded, new_balance = result
+    await update.message.reply_text(f"Sifariş `{order_id}` üzrə `{refunded:.2f} AZN` istifadəçi `{user_id}` balansına qaytarıldı.")
+    try:
+        await context.bot.send_message(
+            chat_id=user_id,
+            text=f"Sifarişiniz (`{order_id}`) ləğv olundu və `{refunded:.2f} AZN` balansınıza qaytarıldı. Yeni balansınız: **{new_balance:.2f} AZN**.",
+            parse_mode="Markdown"
+        )
+    except Exception as e:
+        logger.error(f"Could not send refund message to user {user_id} for order {order_id}: {e}")
+
+async def stats_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin üçün satış statistikası: /stats [from=YYYY-MM-DD] [to=YYYY-MM-DD] (standart olaraq bu gün, UTC)"""
+    if update.message.from_user.id != config.ADMIN_ID:
+        await update.message.reply_text("Sizin bu əmri istifadə etmək səlahiyyətiniz yoxdur.")
+        return
+
+    period = {}
+    for arg in context.args:
+        key, _, value = arg.partition("=")
+        if key not in ("from", "to") or not value:
+            await update.message.reply_text("Yanlış format. İstifadə: `/stats from=2024-01-01 to=2024-01-31`", parse_mode="Markdown")
+            return
+        try:
+            period[key] = datetime.date.fromisoformat(value)
+        except ValueError:
+            await update.message.reply_text("Tarix YYYY-MM-DD formatında olmalıdır.")
+            return
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    start = period.get("from", period.get("to", today))
+    end = period.get("to", max(start, today))
+    if start > end:
+        await update.message.reply_text("Başlanğıc tarixi son tarixdən sonra ola bilməz.")
+        return
+
+    since, until = start.isoformat(), end.isoformat()
+    rows = await database.get_order_stats(since, until)
+    title = f"**Statistika: {since}**" if since == until else f"**Statistika: {since} — {until}**"
+    if not rows:
+        await update.message.reply_text(f"{title} (UTC)\n\nBu dövrdə sifariş yoxdur.", parse_mode="Markdown")
+        return
+
+    lines = [f"{title} (UTC)\n"]
+    for service_type, placed, quantity, revenue, completed, _, refunded, refunded_revenue in rows:
+        line = f"`{service_type}`: {placed} sifariş, {quantity:g} ədəd, **{revenue:.2f} AZN** | tamamlanıb: {completed}"
+        if refunded:
+            line += f" | qaytarılıb: {refunded} ({refunded_revenue:.2f} AZN)"
+        lines.append(line)
+    total_revenue = sum(row[3] for row in rows)
+    total_refunded = sum(row[7] for row in rows)
+    lines.append(f"\nCəmi: {sum(row[1] for row in rows)} sifariş, satış **{total_revenue:.2f} AZN**, "
+                 f"qaytarılıb {total_refunded:.2f} AZN, xalis **{total_revenue - total_refunded:.2f} AZN**")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+EXPORT_FILTER_KEYS = {"from": "since", "to": "until", "status": "status"}
+
+async def export_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin üçün eksport: /export <orders|users|services> [csv|jsonl] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [status=<status>]"""
+    if update.message.from_user.id != config.ADMIN_ID:
+        await update.message.reply_text("Sizin bu əmri istifadə etmək səlahiyyətiniz yoxdur.")
+        return
+
+    from export import EXPORT_FORMATS, write_export
+
+    usage = "İstifadə: `/export orders csv from=2024-01-01 to=2024-01-31 status=completed` (cədvəl: orders, users, services; format: csv, jsonl)"
+    args = context.args
+    if not args or args[0] not in database.EXPORT_QUERIES:
+        await update.message.reply_text(f"Yanlış format. {usage}", parse_mode="Markdown")
+        return
+
+    table = args[0]
+    export_format = "csv"
+    export_filters = {}
+    for arg in args[1:]:
+        if arg in EXPORT_FORMATS:
+            export_format = arg
+            continue
+        key, _, value = arg.partition("=")
+        if key not in EXPORT_FILTER_KEYS or not value:
+            await update.message.reply_text(f"Yanlış filtr. {usage}", parse_mode="Markdown")
+            return
+        if key in ("from", "to"):
+            try:
+                datetime.date.fromisoformat(value)
+            except ValueError:
+                await update.message.reply_text("Tarix YYYY-MM-DD formatında olmalıdır.")
+                return
+        export_filters[EXPORT_FILTER_KEYS[key]] = value
+
+    file_name = f"{table}_{datetime.date.today().isoformat()}.{export_format}.gz"
+    fd, path = tempfile.mkstemp(suffix=".gz")
+    os.close(fd)
+    try:
+        # Fayl ayrıca thread-də və ayrıca bağlantı ilə yazılır: nə event loop, nə də DB thread-i bloklanır
+        row_count = await asyncio.to_thread(write_export, path, table, export_format, **export_filters)
+        size = os.path.getsize(path)
+        if size > config.EXPORT_MAX_FILE_SIZE:
+            await update.message.reply_text(
+                f"Eksport faylı çox böyükdür ({size / 1024 / 1024:.1f} MB, {row_count} sətir; limit "
+                f"{config.EXPORT_MAX_FILE_SIZE / 1024 / 1024:.0f} MB). Tarix aralığını daraldın, məs. "
+                f"`/export {table} {export_format} from=2024-01-01 to=2024-01-31`.",
+                parse_mode="Markdown",
+            )
+            return
+        with open(path, "rb") as document:
+            # read_file_handle=False: fayl yaddaşa oxunmur, yükləmə zamanı hissə-hissə göndərilir
+            await context.bot.send_document(
+                chat_id=update.message.chat_id,
+                document=InputFile(document, filename=file_name, read_file_handle=False),
+                caption=f"{table}: {row_count} sətir"
+            )
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+    finally:
+        os.remove(path)
 
 async def set_price_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Admin üçün xidmət qiymətini dəyişmək: /set_price"""
@@ -511,7 +1038,7 @@ async def set_price_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("Sizin bu əmri istifadə etmək səlahiyyətiniz yoxdur.")
         return
 
-    services = database.get_all_services()
+    services = list(catalog.PRICES.items())
     if not services:
         await update.message.reply_text("Sistemdə heç bir xidmət yoxdur.")
         return
@@ -541,18 +1068,250 @@ async def handle_admin_set_price_callback(update: Update, context: ContextTypes.
     USER_STATES[user_id] = AWAITING_ADMIN_PRICE_CHANGE_AMOUNT
 
 
-def main() -> None:
-    """Botu başladır."""
-    database.init_db()
+async def run_broadcast(broadcast_id, text, last_user_id=0, sent=0, failed=0):
+    """Mesajı bütün istifadəçilərə partiyalarla göndərir, hər partiyadan sonra irəliləyişi yadda saxlayır."""
+    started = time.monotonic()
+    processed_before = sent + failed
+    while True:
+        user_ids = await database.get_user_ids_after(last_user_id, config.BROADCAST_BATCH_SIZE)
+        if not user_ids:
+            break
+        results = await asyncio.gather(*(SEND_QUEUE.send_message(user_id, text) for user_id in user_ids))
+        batch_sent = sum(1 for result in results if result is not None)
+        sent += batch_sent
+        failed += len(results) - batch_sent
+        last_user_id = user_ids[-1]
+        await database.update_broadcast_progress(broadcast_id, last_user_id, sent, failed)
+
+    await database.finish_broadcast(broadcast_id)
+    elapsed = time.monotonic() - started
+    rate = (sent + failed - processed_before) / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Broadcast {broadcast_id} finished: sent={sent} failed={failed} rate={rate:.1f}/s")
+    await SEND_QUEUE.send_message(
+        config.ADMIN_ID,
+        f"Yayım #{broadcast_id} bitdi.\nGöndərildi: {sent}\nAlınmadı: {failed}\nSürət: {rate:.1f} mesaj/san"
+    )
+
+def start_broadcast_task(broadcast_id, text, last_user_id=0, sent=0, failed=0):
+    task = asyncio.create_task(run_broadcast(broadcast_id, text, last_user_id, sent, failed))
+    BROADCAST_TASKS.add(task)
+    task.add_done_callback(BROADCAST_TASKS.discard)
 
-    # Render üçün Webhook konfiqurasiyası
-    PORT = int(os.environ.get('PORT', '8000'))
-    WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+async def broadcast_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin üçün bütün istifadəçilərə mesaj göndərmək: /broadcast <mətn>"""
+    if update.message.from_user.id != config.ADMIN_ID:
+        await update.message.reply_text("Sizin bu əmri istifadə etmək səlahiyyətiniz yoxdur.")
+        return
+
+    text = update.message.text.partition(" ")[2].strip()
+    if not text:
+        running = await database.get_running_broadcasts()
+        status_lines = [f"#{broadcast_id}: göndərildi {sent}, alınmadı {failed}" for broadcast_id, _, _, sent, failed in running]
+        await update.message.reply_text(
+            "İstifadə: `/broadcast <mətn>`" + ("\n\nDavam edən yayımlar:\n" + "\n".join(status_lines) if status_lines else ""),
+            parse_mode="Markdown"
+        )
+        return
 
-    application = Application.builder().token(config.BOT_TOKEN).build()
+    broadcast_id = await database.create_broadcast(text)
+    start_broadcast_task(broadcast_id, text)
+    await update.message.reply_text(f"Yayım #{broadcast_id} başladı. Bitdikdə hesabat göndəriləcək.")
+
+async def flush_admin_digest(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue tərəfindən dövri çağırılır."""
+    await ADMIN_DIGEST.flush(context.bot)
+
+async def prune_admin_messages_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    deleted = await database.prune_admin_messages(config.ADMIN_MESSAGES_RETENTION_DAYS)
+    if deleted:
+        logger.info(f"Pruned {deleted} old admin message mappings")
+
+async def archive_orders_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Köhnə bağlanmış sifarişləri arxivə köçürür və boşalan səhifələri fayldan azad edir."""
+    archived = await database.archive_orders(config.ARCHIVE_AFTER_DAYS, config.ARCHIVE_BATCH_SIZE)
+    freed_pages = await database.incremental_vacuum()
+    if archived or freed_pages:
+        logger.info(f"Archived {archived} orders, freed {freed_pages} database pages")
+
+# --- Avtomatik icra ---
+FULFILLMENT_WORKER = None # İlk fulfillment_job-da yaradılır (soyuq başlanğıcı ləngitməsin)
+
+async def notify_fulfilled_orders(completed):
+    await notify_users([(user_id, ORDER_COMPLETED_MESSAGE.format(order_id=order_id)) for order_id, user_id in completed])
+
+async def notify_failed_orders(failed):
+    await notify_users([
+        (user_id, f"Təəssüf ki, sifarişiniz (`{order_id}`) icra oluna bilmədi və `{refunded:.2f} AZN` balansınıza qaytarıldı. "
+                  f"Yeni balansınız: **{new_balance:.2f} AZN**.")
+        for order_id, user_id, refunded, new_balance, _ in failed
+    ])
+    lines = [f"`{order_id}` (user `{user_id}`, {refunded:.2f} AZN): {reason[:100]}" for order_id, user_id, refunded, new_balance, reason in failed[:20]]
+    if len(failed) > 20:
+        lines.append(f"... və daha {len(failed) - 20} sifariş")
+    await SEND_QUEUE.send_message(config.ADMIN_ID, "**Avtomatik icra alınmadı, məbləğ qaytarıldı:**\n" + "\n".join(lines),
+                                  parse_mode="Markdown")
+
+async def notify_partial_orders(partial):
+    await notify_users([
+        (user_id, f"Sifarişiniz (`{order_id}`) qismən icra olundu: `{remains:g}` ədəd yerinə yetirilmədi və "
+                  f"`{refunded:.2f} AZN` balansınıza qaytarıldı. Yeni balansınız: **{new_balance:.2f} AZN**.")
+        for order_id, user_id, remains, refunded, new_balance in partial
+    ])
+    lines = [f"`{order_id}` (user `{user_id}`): {remains:g} ədəd icra olunmadı, {refunded:.2f} AZN qaytarıldı"
+             for order_id, user_id, remains, refunded, _ in partial[:20]]
+    if len(partial) > 20:
+        lines.append(f"... və daha {len(partial) - 20} sifariş")
+    await SEND_QUEUE.send_message(config.ADMIN_ID, "**Provayder sifarişi qismən icra etdi:**\n" + "\n".join(lines),
+                                  parse_mode="Markdown")
+
+async def notify_orders_needing_review(orders):
+    lines = [f"`{order_id}`: {reason}" for order_id, reason in orders[:20]]
+    if len(orders) > 20:
+        lines.append(f"... və daha {len(orders) - 20} sifariş")
+    await SEND_QUEUE.send_message(
+        config.ADMIN_ID,
+        "**Bu sifarişlər avtomatik bağlanmadı** (paneldə yoxlayın, sonra /done və ya /refund):\n" + "\n".join(lines),
+        parse_mode="Markdown",
+    )
 
+def build_fulfillment_worker():
+    provider = fulfillment.SmmPanelProvider(config.FULFILLMENT_API_URL, config.FULFILLMENT_API_KEY, config.FULFILLMENT_SERVICES,
+                                            config.FULFILLMENT_MAX_CONNECTIONS, config.FULFILLMENT_TIMEOUT)
+    return fulfillment.FulfillmentWorker(
+        provider, config.FULFILLMENT_SERVICES, notify_fulfilled_orders, notify_partial_orders, notify_failed_orders,
+        batch_size=config.FULFILLMENT_BATCH_SIZE, poll_batch_size=config.FULFILLMENT_POLL_BATCH_SIZE,
+        max_attempts=config.FULFILLMENT_MAX_ATTEMPTS, retry_delay=config.FULFILLMENT_RETRY_DELAY,
+        on_needs_review=notify_orders_needing_review,
+    )
+
+async def fulfillment_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Pending sifarişləri provayderə göndərir və göndərilmişlərin statusunu yoxlayır."""
+    global FULFILLMENT_WORKER
+    if FULFILLMENT_WORKER is None:
+        FULFILLMENT_WORKER = build_fulfillment_worker()
+        unsubmitted = await FULFILLMENT_WORKER.report_unsubmitted()
+        if unsubmitted:
+            await SEND_QUEUE.send_message(
+                config.ADMIN_ID,
+                f"Bu sifarişlər provayderə göndərilərkən bot dayandı, provayderdə olub-olmadıqları bilinmir "
+                f"(paneldə yoxlayın, sonra /done və ya /refund): {', '.join(map(str, unsubmitted[:100]))}"
+                + (f" ... və daha {len(unsubmitted) - 100}" if len(unsubmitted) > 100 else ""),
+            )
+    await FULFILLMENT_WORKER.run_once()
+
+async def reload_catalog_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await catalog.load()
+
+async def snapshot_balances_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ledger snapshot-larını dövri yeniləyir ki, balans yoxlaması bütün tarixçəni oxumasın."""
+    count = await database.snapshot_balances(config.LEDGER_SNAPSHOT_MIN_ENTRIES)
+    if count:
+        logger.info(f"Wrote {count} balance snapshots")
+
+async def post_init(application: Application) -> None:
+    """Bot işə düşməzdən əvvəl yalnız ilk update-ə cavab üçün lazım olanları hazırlayır.
+
+    Qalanı (metrik serveri, yayımların bərpası) deferred_startup-da, ilk cavabdan sonra işləyir.
+    """
+    with startup.phase("init_db"):
+        await database.init_db()
+    with startup.phase("load catalog and states"):
+        await asyncio.gather(catalog.load(), USER_STATES.load(), ORDER_DRAFTS.load(), ORDERS_LIST_FILTERS.load())
+    SEND_QUEUE.start(application.bot)
+    # Heç bir update gəlməsə də, ehtiyat olaraq bir müddət sonra işə düşür
+    application.job_queue.run_once(deferred_startup_job, when=config.STARTUP_WARMUP_DELAY)
+
+DEFERRED_STARTUP_DONE = False
+
+async def deferred_startup(application: Application) -> None:
+    """Başlanğıcın təcili olmayan hissəsi (bir dəfə işləyir)."""
+    global DEFERRED_STARTUP_DONE, METRICS_SERVER
+    if DEFERRED_STARTUP_DONE:
+        return
+    DEFERRED_STARTUP_DONE = True
+    with startup.phase("deferred startup"):
+        if config.METRICS_PORT:
+            METRICS_SERVER = await metrics.start_http_server(config.METRICS_PORT)
+        # Yarımçıq qalmış yayımları davam etdir
+        if RUNS_BACKGROUND_JOBS:
+            for broadcast_id, text, last_user_id, sent, failed in await database.get_running_broadcasts():
+                logger.info(f"Resuming broadcast {broadcast_id} after user {last_user_id}")
+                start_broadcast_task(broadcast_id, text, last_user_id, sent, failed)
+
+async def deferred_startup_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await deferred_startup(context.application)
+
+async def record_first_response(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Bütün handler-lərdən sonra işləyir: ilk update-in emal olunduğu anı qeyd edir və təxirə salınmış işləri başladır."""
+    if not startup.record_first_response():
+        return
+    logger.info(f"Time to first response: {startup.TIME_TO_FIRST_RESPONSE * 1000:.0f} ms since process start")
+    if config.STARTUP_PROFILE:
+        logger.info("Startup profile:\n" + startup.report())
+    context.application.create_task(deferred_startup(context.application))
+
+async def post_stop(application: Application) -> None:
+    """Update emalı dayandıqdan sonra, bot-un HTTP klienti hələ açıq ikən göndərişləri bitirir."""
+    # Yayımlar növbəti başlanğıcda yadda saxlanılmış yerdən davam edəcək
+    for task in list(BROADCAST_TASKS):
+        task.cancel()
+    await asyncio.gather(*BROADCAST_TASKS, return_exceptions=True)
+    # Toplu əməliyyatların bildirişləri bərpa olunmur — göndərilənə qədər bir müddət gözlənilir
+    if NOTIFICATION_TASKS:
+        _, pending = await asyncio.wait(NOTIFICATION_TASKS, timeout=config.SHUTDOWN_DRAIN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Cancelled {len(pending)} bulk notification task(s) on shutdown")
+    if ADMIN_DIGEST is not None:
+        await ADMIN_DIGEST.flush(application.bot)
+    await SEND_QUEUE.stop()
+
+async def post_shutdown(application: Application) -> None:
+    """Bot dayandıqdan sonra verilənlər bazası bağlantısını bağlayır."""
+    if METRICS_SERVER is not None:
+        METRICS_SERVER.close()
+    if FULFILLMENT_WORKER is not None:
+        await FULFILLMENT_WORKER.provider.close()
+    await database.close_db()
+
+async def count_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    metrics.UPDATES.inc()
+
+def flood_kind(update: Update):
+    if update.callback_query is not None:
+        return "callback"
+    if update.message is not None:
+        return "media" if update.message.effective_attachment else "text"
+    return None
+
+async def flood_guard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Limiti aşan update-i heç bir handler-ə (və verilənlər bazasına) çatmadan atır."""
+    user = update.effective_user
+    if user is None or user.id == config.ADMIN_ID:
+        return
+    kind = flood_kind(update)
+    verdict = FLOOD_CONTROL.check(user.id, kind)
+    if verdict == flood_control.ALLOWED:
+        return
+    metrics.FLOOD_DROPPED.inc(kind)
+    if verdict == flood_control.MUTED:
+        metrics.FLOOD_MUTES.inc()
+        logger.warning(f"Muted user {user.id} for {config.FLOOD_MUTE_SECONDS:.0f}s for flooding ({kind})")
+        # Xəbərdarlıq bir dəfə, susdurulma anında; istifadəçinin növbəsini gözlətməmək üçün fonda
+        context.application.create_task(SEND_QUEUE.send_message(
+            user.id, f"Çox tez-tez mesaj göndərdiyiniz üçün {max(1, round(config.FLOOD_MUTE_SECONDS / 60))} dəqiqə cavab verilməyəcək."
+        ))
+    raise ApplicationHandlerStop
+
+# Yalnız idarə etdiyimiz update növləri (mesajlar və inline düymələr) — qalanları Telegram göndərmir
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+def register_handlers(application: Application) -> None:
+    """Bütün idarəçiləri tətbiqə əlavə edir."""
     # Əmrlər
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("my_orders", show_my_orders))
 
     # Admin əmrləri
     application.add_handler(CommandHandler("add", add_balance_admin))
@@ -560,11 +1319,22 @@ def main() -> None:
     application.add_handler(CommandHandler("orders", get_orders_admin))
     application.add_handler(CommandHandler("get_balance", get_balance_admin))
     application.add_handler(CommandHandler("set_price", set_price_admin))
+    application.add_handler(CommandHandler("broadcast", broadcast_admin))
+    application.add_handler(CommandHandler("refund", refund_order_admin))
+    application.add_handler(CommandHandler("export", export_admin))
+    application.add_handler(CommandHandler("stats", stats_admin))
+    application.add_handler(CommandHandler("receipts", get_receipts_admin))
+    application.add_handler(CommandHandler("approve", approve_receipt_admin))
 
 
     # Callback Query idarəçisi (Inline düymə klikləri üçün)
-    application.add_handler(CallbackQueryHandler(handle_callback_query))
+    # Pattern-li idarəçilər ümumi idarəçidən əvvəl olmalıdır, əks halda onlara növbə çatmır
     application.add_handler(CallbackQueryHandler(handle_admin_set_price_callback, pattern=r"^set_price_"))
+    application.add_handler(CallbackQueryHandler(handle_orders_page_callback, pattern=r"^orders_(next|prev)_\d{14}_\d+$"))
+    application.add_handler(CallbackQueryHandler(handle_my_orders_page_callback, pattern=r"^my_orders_(next|prev)_\d+$"))
+    application.add_handler(CallbackQueryHandler(handle_order_done_callback, pattern=r"^order_done_\d+$"))
+    application.add_handler(CallbackQueryHandler(handle_receipt_callback, pattern=r"^receipt_(approve_\d+_[\d.]+|reject_\d+)$"))
+    application.add_handler(CallbackQueryHandler(handle_callback_query))
 
 
     # Mətn mesajları idarəçisi (ReplyKeyboardMarkup düymələri və sifarişlər üçün)
@@ -573,21 +1343,114 @@ def main() -> None:
     # Şəkil mesajları idarəçisi (çek göndərmək üçün)
     application.add_handler(MessageHandler(filters.PHOTO, handle_photo_message))
 
+    # Admin CSV faylları (toplu /add və /done)
+    application.add_handler(MessageHandler(filters.Document.ALL & filters.User(user_id=config.ADMIN_ID), handle_admin_document))
+
     # Xəta idarəçisi
     application.add_error_handler(error_handler)
 
+    # Hər idarəçinin icra müddətini ölç
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = metrics.instrument_handler(handler.callback)
+
+    # Flood nəzarəti hər şeydən əvvəl: atılan update sonrakı qruplara (sayğac da daxil) çatmır
+    application.add_handler(TypeHandler(Update, flood_guard), group=-2)
+    # Bütün update-ləri say (digər qruplardan əvvəl işləyir, emalı dayandırmır)
+    application.add_handler(TypeHandler(Update, count_update), group=-1)
+    # İlk cavaba qədər vaxt (handler-lər 0-cı qrupda bitdikdən sonra)
+    application.add_handler(TypeHandler(Update, record_first_response), group=1)
+
+async def set_webhook(bot) -> None:
+    webhook_url = f"{config.WEBHOOK_URL.rstrip('/')}/{config.WEBHOOK_PATH.strip('/')}"
+    logger.info(f"Setting up webhook for URL: {webhook_url}")
+    await bot.set_webhook(
+        url=webhook_url,
+        secret_token=config.WEBHOOK_SECRET_TOKEN,
+        max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=ALLOWED_UPDATES,
+        drop_pending_updates=config.WEBHOOK_DROP_PENDING_UPDATES,
+    )
+
+async def run_application(application: Application, serve) -> None:
+    """Tətbiqi (Updater olmadan) işə salır, serve() qayıdana qədər işlədir və növbəni boşaldaraq dayandırır."""
+    async def initialize():
+        with startup.phase("initialize (getMe)"):
+            await application.initialize()
+
+    # getMe şəbəkə sorğusu ilə verilənlər bazasının hazırlanması paralel gedir
+    await asyncio.gather(initialize(), post_init(application))
+    with startup.phase("application.start"):
+        await application.start()
+    try:
+        await serve()
+    finally:
+        # Növbədə qalan və emal olunan update-lər bitənə qədər gözlənilir; webhook silinmir ki,
+        # deploy zamanı gələn update-lər Telegram-da gözləyib yeni instansiyaya çatsın
+        await application.stop()
+        await post_stop(application)
+        await application.shutdown()
+        await post_shutdown(application)
+
+async def run_webhook(application: Application) -> None:
+    """Webhook rejimi: öz serverimiz (secret token yoxlaması, /healthz, /metrics) və SIGTERM-də drain."""
+    from webhook_server import WebhookServer
+
+    server = WebhookServer(application, config.WEBHOOK_PATH, config.WEBHOOK_SECRET_TOKEN, config.SHUTDOWN_DRAIN_TIMEOUT)
+
+    async def serve():
+        server.start(config.WEBHOOK_LISTEN, config.PORT)
+        await set_webhook(application.bot)
+        await server.wait_stopped()
+
+    await run_application(application, serve)
+
+def build_application(polling: bool) -> Application:
+    """Handler-ləri və dövri işləri qoşulmuş Application qaytarır."""
+    with startup.phase("build_application"):
+        return _build_application(polling)
+
+def _build_application(polling: bool) -> Application:
+    # Hər HTTPXRequest öz SSL kontekstini yaradıb sertifikatları diskdən oxuyur (~30 ms); bir kontekst kifayətdir
+    ssl_context = httpx.create_ssl_context()
+    builder = (
+        Application.builder()
+        .token(config.BOT_TOKEN)
+        .request(HTTPXRequest(httpx_kwargs={"verify": ssl_context}))
+        .get_updates_request(HTTPXRequest(connection_pool_size=1, httpx_kwargs={"verify": ssl_context}))
+        .concurrent_updates(PerUserUpdateProcessor(config.MAX_CONCURRENT_UPDATES))
+        .base_url(config.TELEGRAM_BASE_URL)
+    )
+    if polling:
+        application = builder.post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown).build()
+    else:
+        application = builder.updater(None).build() # Update-ləri WebhookServer və ya front-end gətirir
+    register_handlers(application)
+
+    if ADMIN_DIGEST is not None:
+        application.job_queue.run_repeating(flush_admin_digest, interval=config.ADMIN_DIGEST_INTERVAL)
+    if RUNS_BACKGROUND_JOBS:
+        application.job_queue.run_repeating(snapshot_balances_job, interval=config.LEDGER_SNAPSHOT_INTERVAL)
+        application.job_queue.run_repeating(prune_admin_messages_job, interval=config.ADMIN_MESSAGES_PRUNE_INTERVAL, first=60)
+        application.job_queue.run_repeating(archive_orders_job, interval=config.ARCHIVE_INTERVAL, first=120)
+        if config.FULFILLMENT_API_URL:
+            application.job_queue.run_repeating(fulfillment_job, interval=config.FULFILLMENT_INTERVAL, first=config.FULFILLMENT_INTERVAL)
+    if config.WORKER_INDEX is not None:
+        # Qiymət başqa worker-də dəyişdirilə bilər
+        application.job_queue.run_repeating(reload_catalog_job, interval=config.CATALOG_RELOAD_INTERVAL)
+    return application
+
+def main() -> None:
+    """Botu başladır."""
     # Botu davamlı dinlə
-    if WEBHOOK_URL:
-        logger.info(f"Setting up webhook for URL: {WEBHOOK_URL}")
-       application.run_webhook(
-           listen="0.0.0.0",
-           port=int(os.environ.get("PORT", "8443")),
-           url_path=config.BOT_TOKEN, # Telegram-ın bot tokeni ilə gələn müraciətləri tanımalıdır
-           webhook_url=f"{WEBHOOK_URL}{config.BOT_TOKEN}" # Düzgün URL birləşməsi
-)
+    if config.WEBHOOK_URL and config.WORKERS > 1:
+        import sharding
+        asyncio.run(sharding.run_front_end(set_webhook))
+    elif config.WEBHOOK_URL:
+        asyncio.run(run_webhook(build_application(polling=False)))
     else:
         logger.info("WEBHOOK_URL not set, running in polling mode (for local development or debugging).")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        build_application(polling=True).run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,52 @@
+import re
+
+# Sifariş mətnindəki açar söz -> xidmət növü (Azərbaycan dilindəki variantlar daxil)
+KEYWORD_KINDS = {
+    "like": "like",
+    "likes": "like",
+    "layk": "like",
+    "bəyəni": "like",
+    "beyeni": "like",
+    "follower": "follower",
+    "followers": "follower",
+    "izləyici": "follower",
+    "izleyici": "follower",
+    "view": "view",
+    "views": "view",
+    "baxış": "view",
+    "baxis": "view",
+    "abuneci": "subscriber",
+    "abunəçi": "subscriber",
+    "abunə": "subscriber",
+    "abune": "subscriber",
+    "subscriber": "subscriber",
+}
+
+# (kateqoriya, növ) -> xidmət adı. Kateqoriya seçilməyibsə ("") like/follower Instagram-a, view Telegram-a gedir.
+SERVICES = {}
+for _category in ("", "tiktok", "instagram", "telegram"):
+    _platform = _category if _category in ("tiktok", "instagram") else "instagram"
+    SERVICES[(_category, "like")] = f"{_platform}_like"
+    SERVICES[(_category, "follower")] = f"{_platform}_follower"
+    SERVICES[(_category, "view")] = f"{_category or 'telegram'}_view"
+    SERVICES[(_category, "subscriber")] = "telegram_subscriber"
+
+# Uzun açar sözlər əvvəl gəlməlidir ki, "likes" "like" kimi kəsilməsin
+ORDER_PATTERN = re.compile(
+    r"(\d+\.?\d*)\s*(k)?\s*("
+    + "|".join(re.escape(keyword) for keyword in sorted(KEYWORD_KINDS, key=len, reverse=True))
+    + ")"
+)
+
+def parse_order(text, category=""):
+    """Kiçik hərfli sifariş mətnini təhlil edir: "3k like" -> (3000.0, "like", "tiktok_like").
+
+    Mətn sifariş formatında deyilsə None qaytarır.
+    """
+    match = ORDER_PATTERN.match(text)
+    if not match:
+        return None
+    num_str, k_prefix, keyword = match.groups()
+    amount = float(num_str) * (1000 if k_prefix else 1)
+    kind = KEYWORD_KINDS[keyword]
+    return amount, keyword, SERVICES.get((category, kind)) or SERVICES[("", kind)]
@@ -0,0 +1,149 @@
+import asyncio
+import datetime
+import logging
+import time
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Saniyədə rate token dolan, ən çox capacity token saxlayan vedrə."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SendQueue:
+    """Telegram-a gedən mesajlar üçün tempi idarə olunan növbə.
+
+    Ümumi sürət token vedrəsi ilə, eyni çata göndərişlər isə per_chat_interval ilə məhdudlaşdırılır.
+    Çatın növbəti vaxtı hələ çatmamış mesaj işçini tutmur: o vaxta qədər gecikdirilir (loop.call_later) və
+    yalnız sonra işçilərin növbəsinə düşür, ona görə bir çata yığılan mesajlar digər çatları gözlətmir.
+    RetryAfter alındıqda bütün işçilər göstərilən müddət qədər dayanır və mesaj yenidən göndərilir.
+    """
+
+    def __init__(self, rate, per_chat_interval, workers=8, max_retries=3):
+        self.per_chat_interval = per_chat_interval
+        self.workers = workers
+        self.max_retries = max_retries
+        self.bot = None
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self._bucket = TokenBucket(rate, capacity=rate)
+        self._queue = asyncio.Queue()
+        self._next_slot = {} # {chat_id: bu çata növbəti göndərişin ən tez vaxtı}
+        self._delayed = {} # {ardıcıl nömrə: vaxtı çatanda mesajı növbəyə qoyacaq TimerHandle}
+        self._delayed_seq = 0
+        self._paused_until = 0.0
+        self._tasks = []
+
+    def __len__(self):
+        return self._queue.qsize() + len(self._delayed)
+
+    def start(self, bot):
+        self.bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for handle in self._delayed.values():
+            handle.cancel()
+        self._delayed.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, method, chat_id, **kwargs):
+        """Bot metodunu (məs. "send_message") növbəyə qoyur və nəticəni gözləyir.
+
+        Uğurlu olduqda Telegram-ın cavabını, alınmadıqda None qaytarır.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        item = (method, chat_id, kwargs, future)
+        delay = self._reserve_chat_slot(chat_id) - time.monotonic()
+        if delay > 0:
+            self._delayed_seq += 1
+            self._delayed[self._delayed_seq] = loop.call_later(delay, self._release, self._delayed_seq, item)
+        else:
+            self._queue.put_nowait(item)
+        return await future
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self.submit("send_message", chat_id, text=text, **kwargs)
+
+    def _reserve_chat_slot(self, chat_id):
+        """Bu çata növbəti göndəriş vaxtını ayırır və qaytarır (monotonic)."""
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, 0.0))
+        self._next_slot[chat_id] = slot + self.per_chat_interval
+        if len(self._next_slot) > 10000:
+            self._next_slot = {chat: at for chat, at in self._next_slot.items() if at > now}
+        return slot
+
+    def _release(self, seq, item):
+        del self._delayed[seq]
+        self._queue.put_nowait(item)
+
+    async def _send(self, method, chat_id, kwargs):
+        for attempt in range(self.max_retries + 1):
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._bucket.acquire()
+            try:
+                return await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                self.retries += 1
+                metrics.TELEGRAM_API_RETRIES.inc("flood_control")
+                retry_after = e.retry_after
+                if isinstance(retry_after, datetime.timedelta):
+                    retry_after = retry_after.total_seconds()
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                logger.warning("Flood control hit, pausing sends for %s seconds", retry_after)
+            except (Forbidden, BadRequest) as e:
+                # İstifadəçi botu bloklayıb və ya çat mövcud deyil — təkrarın mənası yoxdur
+                logger.info("Could not send %s to %s: %s", method, chat_id, e)
+                return None
+            except TelegramError as e:
+                self.retries += 1
+                metrics.TELEGRAM_API_RETRIES.inc("network")
+                logger.warning("Send %s to %s failed (attempt %s): %s", method, chat_id, attempt + 1, e)
+                await asyncio.sleep(2 ** attempt)
+        return None
+
+    async def _worker(self):
+        while True:
+            method, chat_id, kwargs, future = await self._queue.get()
+            try:
+                result = await self._send(method, chat_id, kwargs)
+            except Exception as e:
+                logger.error("Unexpected error while sending %s to %s: %s", method, chat_id, e)
+                result = None
+            if result is None:
+                self.failed += 1
+            else:
+                self.sent += 1
+            if not future.done():
+                future.set_result(result)
+            self._queue.task_done()
@@ -0,0 +1,132 @@
+"""Çoxprosesli rejim: webhook front-end update-ləri user_id-yə görə worker proseslərinə paylayır.
+
+Front-end (python main.py, WORKERS > 1) handler işlətmir: secret token-i yoxlayır, update-dən istifadəçi
+ID-sini çıxarır və xam JSON-u həmin istifadəçinin shard-ına socketpair üzərindən ötürür. Hər worker
+(python -m sharding <index> <fd>) main.py-dakı handler-ləri öz Application-ı ilə işlədir. Eyni istifadəçi
+həmişə eyni worker-ə düşdüyü üçün USER_STATES, ORDER_DRAFTS və keşlər prosesin yaddaşında qalır.
+Bütün worker-lər eyni SQLite faylını WAL rejimində paylaşır; hər prosesin içində yazılar tək DB thread-indən keçir.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+
+from telegram import Bot, Update
+
+import config
+import database
+from webhook_server import WebhookServer
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct("!I") # Hər update: 4 baytlıq uzunluq + JSON
+
+
+def shard_for(user_id, shard_count):
+    return user_id % shard_count
+
+
+def extract_user_id(data):
+    """Update JSON-undan göndərənin ID-sini tapır (message.from, callback_query.from və s.); yoxdursa 0."""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            sender = value.get("from")
+            if sender:
+                return sender.get("id", 0)
+    return 0
+
+
+class ShardedWebhookServer(WebhookServer):
+    """Update-ləri öz növbəsinə deyil, worker proseslərinə yönləndirən webhook serveri."""
+
+    def __init__(self, url_path, secret_token, drain_timeout, writers, workers):
+        super().__init__(None, url_path, secret_token, drain_timeout)
+        self.writers = writers
+        self.workers = workers
+
+    def is_healthy(self):
+        return not self.draining and all(worker.returncode is None for worker in self.workers)
+
+    async def submit(self, body):
+        data = json.loads(body)
+        writer = self.writers[shard_for(extract_user_id(data), len(self.writers))]
+        writer.write(FRAME_HEADER.pack(len(body)) + body)
+        await writer.drain()
+
+
+async def start_workers(count):
+    """count sayda worker prosesi başladır; (writers, processes) qaytarır."""
+    writers = []
+    workers = []
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                      os.environ.get("PYTHONPATH")])))
+    for index in range(count):
+        front_socket, worker_socket = socket.socketpair()
+        worker = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "sharding", str(index), str(worker_socket.fileno()),
+            pass_fds=(worker_socket.fileno(),), env=dict(env, WORKER_INDEX=str(index)),
+        )
+        worker_socket.close()
+        _, writer = await asyncio.open_connection(sock=front_socket)
+        writers.append(writer)
+        workers.append(worker)
+    logger.info(f"Started {count} worker processes")
+    return writers, workers
+
+
+async def run_front_end(set_webhook):
+    """Front-end prosesi: miqrasiyaları bir dəfə icra edir, worker-ləri başladır və webhook-u dinləyir.
+
+    Dayandırıldıqda worker-lərin socket-ləri bağlanır; hər worker növbəsini boşaldıb özü çıxır.
+    """
+    await database.init_db() # Worker-lər eyni anda miqrasiya etməsin
+    await database.close_db()
+
+    writers, workers = await start_workers(config.WORKERS)
+    server = ShardedWebhookServer(config.WEBHOOK_PATH, config.WEBHOOK_SECRET_TOKEN, config.SHUTDOWN_DRAIN_TIMEOUT,
+                                  writers, workers)
+    server.start(config.WEBHOOK_LISTEN, config.PORT)
+    try:
+        async with Bot(config.BOT_TOKEN, base_url=config.TELEGRAM_BASE_URL) as bot:
+            await set_webhook(bot)
+        await server.wait_stopped()
+    finally:
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*(worker.wait() for worker in workers))
+        logger.info("All worker processes stopped")
+
+
+async def feed_updates(application, sock):
+    """Front-end-dən gələn update-ləri application.update_queue-ya qoyur (socket bağlanana qədər)."""
+    reader, writer = await asyncio.open_connection(sock=sock)
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                body = await reader.readexactly(FRAME_HEADER.unpack(header)[0])
+            except asyncio.IncompleteReadError:
+                return # front-end dayandı
+            await application.update_queue.put(Update.de_json(json.loads(body), application.bot))
+    finally:
+        writer.close()
+
+
+def run_worker(index, fd):
+    import main # handler-lər yalnız worker-də lazımdır
+
+    # Dayandırma front-end-dən gəlir (socket bağlanır) ki, worker növbəsini boşaltmadan ölməsin
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    sock = socket.socket(fileno=fd)
+    application = main.build_application(polling=False)
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+    asyncio.run(main.run_application(application, lambda: feed_updates(application, sock)))
+
+
+if __name__ == "__main__":
+    run_worker(int(sys.argv[1]), int(sys.argv[2]))
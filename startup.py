@@ -0,0 +1,63 @@
+import contextlib
+import logging
+import os
+import time
+
+# Soyuq başlanğıcın ölçülməsi: mərhələlərin müddəti və prosesin başlanğıcından ilk cavaba qədər keçən vaxt.
+# main.py bu modulu digər ağır importlardan əvvəl import edir.
+
+logger = logging.getLogger(__name__)
+
+
+def _process_age():
+    """Prosesin neçə saniyədir işlədiyi (interpreter-in açılışı daxil); /proc olmayan sistemlərdə 0."""
+    try:
+        with open("/proc/self/stat") as stat_file:
+            started_ticks = int(stat_file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        return max(0.0, uptime - started_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+PROCESS_STARTED = time.monotonic() - _process_age()
+PHASES = [("interpreter", 0.0, time.monotonic() - PROCESS_STARTED)] # [(ad, başlanğıc, müddət)] saniyə ilə
+TIME_TO_FIRST_RESPONSE = None
+
+
+def elapsed():
+    return time.monotonic() - PROCESS_STARTED
+
+
+@contextlib.contextmanager
+def phase(name):
+    """with startup.phase("init_db"): ... — mərhələnin başlanğıcını və müddətini qeyd edir."""
+    started = elapsed()
+    try:
+        yield
+    finally:
+        PHASES.append((name, started, elapsed() - started))
+
+
+def mark(name, since):
+    """since anından (elapsed() dəyəri) indiyə qədər olan hissəni mərhələ kimi qeyd edir."""
+    PHASES.append((name, since, elapsed() - since))
+
+
+def record_first_response():
+    """İlk update emal olunduqda bir dəfə çağırılır; True qaytarırsa bu ilk çağırışdır."""
+    global TIME_TO_FIRST_RESPONSE
+    if TIME_TO_FIRST_RESPONSE is not None:
+        return False
+    TIME_TO_FIRST_RESPONSE = elapsed()
+    return True
+
+
+def report():
+    lines = [f"{'phase':32s} {'start ms':>9s} {'took ms':>9s}"]
+    for name, started, duration in PHASES:
+        lines.append(f"{name:32s} {started * 1000:9.1f} {duration * 1000:9.1f}")
+    if TIME_TO_FIRST_RESPONSE is not None:
+        lines.append(f"{'time to first response':32s} {'':9s} {TIME_TO_FIRST_RESPONSE * 1000:9.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,96 @@
+import json
+import time
+from collections import OrderedDict
+
+import database
+
+
+class SQLiteStatePersistence:
+    """Vəziyyətləri verilənlər bazasının conversation_state cədvəlində saxlayır.
+
+    Yazılar DB thread-inə gözləmədən göndərilir, ona görə handler-lər diskə yazılmanı gözləmir.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    async def load(self, now, limit):
+        rows = await database.load_states(self.namespace, now, limit)
+        return [(key, json.loads(value), expires_at) for key, value, expires_at in rows]
+
+    def save(self, key, value, expires_at):
+        database.save_state(self.namespace, key, json.dumps(value), expires_at)
+
+    def delete(self, key):
+        database.delete_state(self.namespace, key)
+
+
+class StateStore:
+    """İstifadəçi ID-si ilə açarlanan, TTL ilə köhnələn və ölçüsü məhdud vəziyyət anbarı.
+
+    dict kimi istifadə olunur (get, pop, store[key] = value). Yazılar açarı sonuncu yerə keçirdiyi üçün
+    ən köhnə (və ilk köhnələn) qeydlər həmişə əvvəldə olur və onların silinməsi O(1)-dir.
+    persistence verildikdə bütün dəyişikliklər ora da yazılır və load() ilə bərpa olunur.
+    refresh_on_get=True olduqda oxunan qeyd də yazılmış kimi sona keçir və müddəti uzanır (LRU keş);
+    sıra yenə də köhnəlmə sırası ilə üst-üstə düşür.
+    """
+
+    def __init__(self, ttl, max_entries, persistence=None, refresh_on_get=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persistence = persistence
+        self.refresh_on_get = refresh_on_get
+        self._entries = OrderedDict() # {key: (expires_at, value)}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.time():
+            self._discard(key)
+            return default
+        if self.refresh_on_get:
+            self[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        expires_at = time.time() + self.ttl
+        self._entries.pop(key, None)
+        self._entries[key] = (expires_at, value)
+        if self.persistence:
+            self.persistence.save(key, value, expires_at)
+        self._evict()
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        if self.persistence:
+            self.persistence.delete(key)
+        expires_at, value = entry
+        return value if expires_at > time.time() else default
+
+    def _discard(self, key):
+        del self._entries[key]
+        if self.persistence:
+            self.persistence.delete(key)
+
+    def _evict(self):
+        """Vaxtı keçmiş və limitdən artıq qeydləri əvvəldən silir."""
+        now = time.time()
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._discard(key)
+
+    async def load(self):
+        """Yenidən başladıqdan sonra vaxtı keçməmiş vəziyyətləri yaddaşa yükləyir."""
+        if not self.persistence:
+            return
+        for key, value, expires_at in await self.persistence.load(time.time(), self.max_entries):
+            self._entries[key] = (expires_at, value)
@@ -0,0 +1,52 @@
+import logging
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Fərqli istifadəçilərin update-lərini paralel, eyni istifadəçinin update-lərini isə gəliş sırası ilə emal edir.
+
+    Hər istifadəçinin bir "zolağı" var. Zolaq məşğuldursa yeni update oraya əlavə olunur və dərhal
+    qayıdır, yəni paralellik limitindən yer tutmur — bir istifadəçi bütün limiti zəbt edə bilməz.
+    Beləliklə USER_STATES, context.user_data və balans üzərində eyni istifadəçinin yarışı olmur.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._lanes = {} # {user_id: gözləyən coroutine-lər}
+
+    def __len__(self):
+        return len(self._lanes)
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            await coroutine
+            return
+
+        lane = self._lanes.get(user.id)
+        if lane is not None:
+            lane.append(coroutine)
+            return
+
+        lane = self._lanes[user.id] = deque([coroutine])
+        try:
+            while lane:
+                next_coroutine = lane.popleft()
+                try:
+                    await next_coroutine
+                except Exception as e:
+                    logger.error(f"Unhandled error while processing update for user {user.id}: {e}")
+        finally:
+            del self._lanes[user.id]
+            for pending in lane: # yalnız ləğv edildikdə dolu qalır
+                pending.close()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,123 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+import tornado.httpserver
+import tornado.web
+from telegram import Update
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    """Telegram-ın POST sorğusunu yoxlayır və update-i application.update_queue-ya qoyur."""
+
+    def initialize(self, server):
+        self.server = server
+
+    async def post(self):
+        token = self.request.headers.get(SECRET_TOKEN_HEADER, "")
+        # bytes kimi müqayisə: str üçün compare_digest qeyri-ASCII simvolda TypeError atır (403 yerinə 500)
+        if not hmac.compare_digest(token.encode(), self.server.secret_token.encode()):
+            raise tornado.web.HTTPError(403)
+        if self.server.draining:
+            # 200 qaytarmırıq ki, Telegram update-i sonra (yeni instansiyaya) yenidən göndərsin
+            raise tornado.web.HTTPError(503)
+        try:
+            await self.server.submit(self.request.body)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            raise tornado.web.HTTPError(400)
+        except ConnectionError as e:
+            logger.error(f"Could not hand over webhook update: {e}")
+            raise tornado.web.HTTPError(503)
+        self.set_status(200)
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    """Platformanın yoxlamaları üçün: işləyirsə 200, dayanırsa 503."""
+
+    def initialize(self, server):
+        self.server = server
+
+    def get(self):
+        if not self.server.is_healthy():
+            self.set_status(503)
+            self.finish("draining\n")
+        else:
+            self.finish("ok\n")
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.finish(metrics.render())
+
+
+def _log_request(handler):
+    # Hər update üçün access log yazmırıq; yalnız xətalar görünür
+    status = handler.get_status()
+    log = logger.warning if status >= 400 else logger.debug
+    log("%s %s %s %.2fms", status, handler.request.method, handler.request.path, 1000 * handler.request.request_time())
+
+
+class WebhookServer:
+    """Webhook rejimi: bir portda Telegram marşrutu, /healthz və /metrics.
+
+    SIGTERM/SIGINT alındıqda yeni update qəbulu dayanır (/healthz 503 qaytarır), açıq sorğular
+    drain_timeout-a qədər tamamlanır, wait_stopped() qayıdır və çağıran application.stop() ilə növbəni boşaldır.
+    """
+
+    def __init__(self, application, url_path, secret_token, drain_timeout):
+        self.application = application
+        self.secret_token = secret_token
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self._stop_requested = asyncio.Event()
+        self._http_server = None
+        self._app = tornado.web.Application([
+            (rf"/{url_path.strip('/')}/?", TelegramWebhookHandler, {"server": self}),
+            (r"/healthz", HealthHandler, {"server": self}),
+            (r"/metrics", MetricsHandler),
+        ], log_function=_log_request)
+
+    def is_healthy(self):
+        return not self.draining and self.application.running
+
+    async def submit(self, body):
+        update = Update.de_json(json.loads(body), self.application.bot)
+        await self.application.update_queue.put(update)
+
+    def request_stop(self):
+        logger.info("Shutdown requested, draining webhook updates")
+        self.draining = True
+        self._stop_requested.set()
+
+    def start(self, listen, port):
+        """Portu açır və SIGTERM/SIGINT idarəçilərini qoşur (event loop daxilində çağırılmalıdır)."""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.request_stop)
+        self._http_server = tornado.httpserver.HTTPServer(self._app, xheaders=True)
+        self._http_server.listen(port, address=listen)
+        logger.info(f"Webhook server listening on {listen}:{port}")
+
+    async def wait_stopped(self):
+        """Dayandırma siqnalını gözləyir, sonra yeni bağlantıları dayandırıb açıq sorğuları bitirir."""
+        try:
+            await self._stop_requested.wait()
+        finally:
+            self._http_server.stop()
+            try:
+                await asyncio.wait_for(self._http_server.close_all_connections(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Timed out closing webhook connections")
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(sig)